@@ -48,6 +48,7 @@ def demo(c):  # pylint: disable=unused-argument, invalid-name
 
     c.run("inv dependencies.build dependencies.package", echo=True)
     c.run("inv --no-dedupe dependencies.build dependencies.package", echo=True)
+    c.run("python parallel.py --jobs 3 dependencies.build dependencies.package", echo=True)
 
 
 @task(build)
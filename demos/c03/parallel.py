@@ -0,0 +1,261 @@
+"""
+Run the pre/post dependency graph with independent tasks in parallel.
+
+The stock invoke `Executor` flattens pre and post tasks into a list and walks
+it one task at a time. In `dependencies.py`, `clean_html`, `clean_tgz` and
+`makedirs` do not depend on each other, but they still wait for one another.
+
+## Things to see:
+1. `ParallelExecutor` expands the same pre/post graph that invoke does, and
+keeps invoke's dedupe semantics, including `--no-dedupe`.
+
+2. Tasks whose dependencies have finished are handed to a thread pool that is
+bounded by `--jobs N`. Anything a task prints, including `context.run`
+output, is prefixed with the task name so interleaved output stays readable.
+
+3. Tasks named on the command line still run in the order they were given;
+only their dependencies are free to overlap.
+
+4. When a task fails no new tasks are started, tasks that are queued but not
+running are cancelled, running siblings are allowed to finish, and the first
+failure is raised.
+
+    ```
+    $ python parallel.py --jobs 3 dependencies.deploy
+    ```
+"""
+
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from invoke import Argument, Call, Executor, Program, Task
+from invoke.util import debug
+
+
+class TaskStream:
+    """ Write to ``stream`` one whole line at a time, prefixed with a task name. """
+
+    def __init__(self, stream, lock, prefix):
+        self._stream = stream
+        self._lock = lock
+        self._prefix = prefix
+        self._buffer = ""
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def write(self, data):
+        """ Write data, holding back any trailing partial line. """
+        lines = (self._buffer + data).split("\n")
+        self._buffer = lines.pop()
+        if lines:
+            with self._lock:
+                for line in lines:
+                    self._stream.write(f"[{self._prefix}] {line}\n")
+                self._stream.flush()
+        return len(data)
+
+    def flush(self):
+        """ Write out any partial line. """
+        if self._buffer:
+            self.write("\n")
+        self._stream.flush()
+
+
+class ThreadStream:
+    """ Stand-in for ``sys.stdout`` that sends each thread to its own stream. """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self._current(), name)
+
+    def _current(self):
+        return getattr(self._local, "task_stream", None) or self.stream
+
+    def for_task(self, prefix):
+        """ Route the calling thread's writes through a prefixed `TaskStream`. """
+        self._local.task_stream = TaskStream(self.stream, self.lock, prefix)
+        return self._local.task_stream
+
+    def write(self, data):
+        """ Write to the calling thread's stream. """
+        return self._current().write(data)
+
+    def flush(self):
+        """ Flush the calling thread's stream. """
+        self._current().flush()
+
+
+class Node:  # pylint: disable=too-few-public-methods
+    """ A single call in the dependency graph. """
+
+    def __init__(self, call, deps, index):
+        self.call = call
+        self.deps = deps
+        # Anything depending on this call waits for it and its post tasks.
+        self.done_when = {index}
+
+
+class ParallelExecutor(Executor):
+    """ An `Executor` that runs independent pre/post tasks concurrently. """
+
+    def __init__(self, collection, config=None, core=None):
+        super().__init__(collection, config, core)
+        self.jobs = 1
+        if core:
+            self.jobs = max(1, core[0].args.jobs.value or 1)
+        self.stop = threading.Event()
+
+    def execute(self, *tasks):
+        """ Execute ``tasks`` and their pre/post tasks as a graph. """
+
+        calls = self.normalize(tasks)
+        try:
+            dedupe = self.config.tasks.dedupe
+        except AttributeError:
+            dedupe = True
+
+        nodes = []
+        previous = set()
+        for call in calls:
+            before = len(nodes)
+            index = self.add_call(call, nodes, dedupe)
+            if index >= before:
+                # Directly given tasks keep their command line order.
+                nodes[index].deps |= previous
+            previous = nodes[index].done_when
+
+        return self.run_graph(nodes, calls)
+
+    @staticmethod
+    def find(nodes, call):
+        """ Index of the node for ``call``, or None. """
+        for index, node in enumerate(nodes):
+            if node.call == call:
+                return index
+        return None
+
+    def add_call(self, call, nodes, dedupe):
+        """ Add ``call`` and its pre/post tasks to ``nodes``, returning its index. """
+
+        if isinstance(call, Task):
+            call = Call(call)
+
+        if dedupe:
+            index = self.find(nodes, call)
+            if index is not None:
+                return index
+
+        deps = set()
+        for pre in call.pre:
+            deps |= nodes[self.add_call(pre, nodes, dedupe)].done_when
+
+        index = len(nodes)
+        debug(f"Adding {call!r} to the graph as node {index}")
+        node = Node(call, deps, index)
+        nodes.append(node)
+
+        for post in call.post:
+            post_index = self.add_call(post, nodes, dedupe)
+            if post_index > index:
+                post_node = nodes[post_index]
+                post_node.deps.add(index)
+                node.done_when |= post_node.done_when
+        return index
+
+    def run_call(self, call, autoprint):
+        """ Run a single call on a worker thread with its own config. """
+
+        name = call.called_as or call.task.name
+        out_stream = sys.stdout.for_task(name)
+        err_stream = sys.stderr.for_task(name)
+        try:
+            if self.stop.is_set():
+                return None
+            debug(f"Executing {call!r}")
+            config = self.config.clone()
+            # `context.run` copies output on its own threads, so hand it the
+            # task's streams directly rather than relying on `sys.stdout`.
+            config.run.out_stream = out_stream
+            config.run.err_stream = err_stream
+            config.load_collection(self.collection.configuration(call.called_as))
+            config.load_shell_env()
+            context = call.make_context(config)
+            result = call.task(context, *call.args, **call.kwargs)
+            if autoprint:
+                print(result)
+            return result
+        finally:
+            out_stream.flush()
+            err_stream.flush()
+
+    def run_graph(self, nodes, direct):
+        """ Run ``nodes`` once their dependencies are done, up to ``jobs`` at once. """
+
+        results = {}
+        pending = dict(enumerate(nodes))
+        finished = set()
+        running = {}
+        failure = None
+
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = ThreadStream(stdout), ThreadStream(stderr)
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                while pending or running:
+                    if failure is None:
+                        for index, node in list(pending.items()):
+                            if node.deps <= finished:
+                                del pending[index]
+                                autoprint = node.call in direct and node.call.autoprint
+                                future = pool.submit(self.run_call, node.call, autoprint)
+                                running[future] = index
+
+                    if not running:
+                        break
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = running.pop(future)
+                        if future.cancelled():
+                            continue
+                        if future.exception() is not None:
+                            if failure is None:
+                                failure = future.exception()
+                                self.stop.set()
+                                for other in running:
+                                    other.cancel()
+                            continue
+                        finished.add(index)
+                        results[nodes[index].call.task] = future.result()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        if failure is not None:
+            raise failure
+        return results
+
+
+class ParallelProgram(Program):
+    """ An `inv` lookalike with a `--jobs` core flag. """
+
+    def core_args(self):
+        return super().core_args() + [
+            Argument(
+                names=("jobs", "j"),
+                kind=int,
+                default=1,
+                help="Run up to N independent tasks at the same time.",
+            )
+        ]
+
+
+program = ParallelProgram(executor_class=ParallelExecutor)  # pylint: disable=invalid-name
+
+if __name__ == "__main__":
+    program.run()
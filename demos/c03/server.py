@@ -0,0 +1,219 @@
+"""
+Keep a task collection loaded and run invocations sent over a Unix socket.
+
+Every `inv ...` call starts a new interpreter, imports invoke and the task
+modules, and builds the `Collection` again. For the many small nested calls in
+`dependencies.demo` or in CI scripts, that startup is most of the runtime.
+
+## Things to see:
+1. `python server.py serve` loads `tasks.py` once, the same way `inv` would,
+and then listens on a Unix socket.
+
+2. Each request is handled in a forked child of the server. The child starts
+with the already loaded modules, but its config, environment, working
+directory and any global state it touches are thrown away when it exits, so
+invocations cannot leak into each other.
+
+3. `python server.py greet --name Rob` is the thin client. It sends its
+arguments, working directory and environment, then prints the output and exits
+with the same code that `inv greet --name Rob` would have.
+
+    ```
+    $ python server.py serve &
+    $ python server.py dependencies.build dependencies.package
+    ```
+
+Callers inside tasks can use `call()` directly, or swap `inv` for
+`python server.py` in their `context.run()` command lines.
+
+4. Each project gets its own server. The socket name is derived from the
+directory holding the loaded `tasks.py`, and the client finds it the same way
+`inv` finds `tasks.py`, by walking up from its working directory. The socket
+lives in `$XDG_RUNTIME_DIR` when set and is only accessible to its owner; the
+server also refuses requests whose working directory belongs to another
+project. Set `INVOKE_SERVER_SOCKET` to use an explicit socket path instead.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import traceback
+
+SOCKET_DIR = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+
+
+def find_project(start=None):
+    """ Return the real path of the directory ``inv`` would load tasks from, or None. """
+
+    path = os.path.realpath(start or os.getcwd())
+    while True:
+        if os.path.isfile(os.path.join(path, "tasks.py")) or os.path.isfile(
+            os.path.join(path, "tasks", "__init__.py")
+        ):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def socket_for(project):
+    """ Return the socket path of the server for the ``project`` directory. """
+
+    digest = hashlib.sha1(project.encode()).hexdigest()[:12]
+    return os.path.join(SOCKET_DIR, f"invoke-{os.getuid()}-{digest}.sock")
+
+
+class ForkingUnixServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """ Handle each connection in a forked child. """
+
+
+class InvocationHandler(socketserver.StreamRequestHandler):
+    """ Run one invocation and send back its exit code and output. """
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+
+        with tempfile.TemporaryFile() as out_file, tempfile.TemporaryFile() as err_file:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(out_file.fileno(), 1)
+            os.dup2(err_file.fileno(), 2)
+
+            code = self.run(request)
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+            out_file.seek(0)
+            err_file.seek(0)
+            response = {
+                "code": code,
+                "stdout": out_file.read().decode(errors="replace"),
+                "stderr": err_file.read().decode(errors="replace"),
+            }
+
+        self.wfile.write(json.dumps(response).encode())
+
+    def run(self, request):
+        """ Run ``request["argv"]`` against the loaded collection, returning the exit code. """
+
+        if find_project(request["cwd"]) != self.server.project:
+            print(
+                f"{request['cwd']} is not part of {self.server.project}; "
+                + "start a server from that project instead.",
+                file=sys.stderr,
+            )
+            return 1
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        from invoke import Program  # pylint: disable=import-outside-toplevel
+
+        program = Program(namespace=self.server.collection)
+        try:
+            program.run(["inv"] + request["argv"])
+        except SystemExit as exc:
+            if exc.code is None:
+                return 0
+            return exc.code if isinstance(exc.code, int) else 1
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            return 1
+        return 0
+
+
+def serve(socket_path=None, start=None):
+    """
+    Load the collection found from ``start`` and serve it until interrupted.
+
+    Without ``socket_path`` the socket is the project's own, see `socket_for()`.
+    """
+
+    # Only the server pays for importing invoke; the client stays thin.
+    from invoke import Collection, FilesystemLoader  # pylint: disable=import-outside-toplevel
+
+    module, parent = FilesystemLoader(start=start).load()
+    collection = Collection.from_module(module, loaded_from=parent)
+    project = os.path.realpath(parent)
+    socket_path = socket_path or socket_for(project)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    # Create the socket owner-only from the start, not chmod it after binding,
+    # so other users never get a window to connect and run commands as us.
+    umask = os.umask(0o177)
+    try:
+        server = ForkingUnixServer(socket_path, InvocationHandler)
+    finally:
+        os.umask(umask)
+
+    with server:
+        os.chmod(socket_path, 0o600)
+        server.collection = collection
+        server.project = project
+        print(f"Serving {parent}/tasks.py on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+
+def call(argv, socket_path=None):
+    """
+    Run ``argv`` on the server, returning the exit code, stdout and stderr.
+
+    Without ``socket_path`` the server of the project around the working
+    directory is used.
+    """
+
+    if socket_path is None:
+        project = find_project()
+        if project is None:
+            raise FileNotFoundError(f"No tasks.py found from {os.getcwd()}")
+        socket_path = socket_for(project)
+
+    request = {"argv": list(argv), "cwd": os.getcwd(), "env": dict(os.environ)}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(socket_path)
+        conn.sendall(json.dumps(request).encode() + b"\n")
+        conn.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        for chunk in iter(lambda: conn.recv(1 << 16), b""):
+            chunks.append(chunk)
+
+    response = json.loads(b"".join(chunks))
+    return response["code"], response["stdout"], response["stderr"]
+
+
+def main(argv):
+    """ `serve` starts the server; anything else is sent to it as `inv` arguments. """
+
+    socket_path = os.environ.get("INVOKE_SERVER_SOCKET")
+
+    if argv[:1] == ["serve"]:
+        serve(socket_path)
+        return 0
+
+    try:
+        code, stdout, stderr = call(argv, socket_path)
+    except FileNotFoundError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
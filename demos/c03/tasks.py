@@ -38,6 +38,10 @@ syntax, `pre=[call(pre_task_name, arg='value')]`
 chain. This default is overridden by using the `invoke` command line
 option, `--no-dedupe`.
 
+4. Tasks that do not depend on each other can run at the same time. See
+`parallel.py`, which runs the same dependency graph on a pool of `--jobs N`
+threads, e.g. `python parallel.py --jobs 3 dependencies.deploy`.
+
 """
 
 from invoke import task
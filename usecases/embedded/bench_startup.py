@@ -0,0 +1,48 @@
+""" Time `tskmstr --list` startup with and without the cached task manifest. """
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+COMMAND = [
+    sys.executable,
+    "-c",
+    "from tskmstr.main import program; program.run(['tskmstr', '--list'])",
+]
+
+
+def time_runs(runs: int, env: dict) -> list:
+    """ Wall clock seconds for each of ``runs`` runs of COMMAND. """
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(COMMAND, env=env, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(runs: int = 20) -> None:
+    """ Print median and best startup times for both modes. """
+
+    base_env = dict(os.environ)
+    base_env.pop("TSKMSTR_NO_MANIFEST", None)
+
+    # Warm the manifest so the first timed run doesn't pay for building it.
+    subprocess.run(COMMAND, env=base_env, stdout=subprocess.DEVNULL, check=True)
+
+    for label, env in (
+        ("import tasks", dict(base_env, TSKMSTR_NO_MANIFEST="1")),
+        ("manifest", base_env),
+    ):
+        timings = time_runs(runs, env)
+        print(
+            f"{label:>12}: median {statistics.median(timings) * 1000:.1f} ms, "
+            + f"best {min(timings) * 1000:.1f} ms over {runs} runs"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -2,9 +2,12 @@
     Show what configuration is necessary to build your own CLI.
     by setting the namespace in the program definition we override
     the defaults present in invoke.
+
+    The namespace comes from a cached manifest (see `manifest.py`), so
+    `--list`, `--help` and completion don't import the task modules.
 """
-from invoke import Collection, Program
+from invoke import Program
 
-from tskmstr import tasks
+from tskmstr.manifest import load_namespace
 
-program = Program(namespace=Collection.from_module(tasks), version="50.0.0")
+program = Program(namespace=load_namespace(), version="50.0.0")
@@ -0,0 +1,177 @@
+"""
+    Answer `--list`, `--help` and completion without importing the tasks.
+
+    The first run imports `tskmstr.tasks` as usual and saves a json manifest of
+    every task's name, docstring and arguments. Later runs build the namespace
+    from that manifest with stand-in tasks; the real task module is imported
+    only when one of them is actually executed. The manifest is rebuilt
+    whenever a source file's size or mtime changes, or the invoke version does.
+"""
+import inspect
+import json
+import os
+
+import invoke
+from invoke import Collection, Task
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MANIFEST_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "tskmstr",
+    "manifest.json",
+)
+
+# Keys copied straight from a Task onto its manifest entry.
+TASK_FIELDS = ("positional", "optional", "iterable", "incrementable", "help")
+
+
+def atomic_write_json(path: str, data) -> None:
+    """
+    Write ``data`` as json to ``path``, replacing the file atomically.
+
+    The same helper as `monorepo_invoke.jsonfile`, which tskmstr can't depend on.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as out_file:
+            json.dump(data, out_file)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def source_stamp() -> dict:
+    """ Size and mtime of every python source in the package, plus invoke's version. """
+
+    stamp = {"invoke": invoke.__version__}
+    for name in sorted(os.listdir(SOURCE_DIR)):
+        if name.endswith(".py"):
+            stat = os.stat(os.path.join(SOURCE_DIR, name))
+            stamp[name] = [stat.st_size, stat.st_mtime_ns]
+    return stamp
+
+
+def describe_task(task: Task, names: dict) -> dict:
+    """ A json friendly description of ``task``. """
+
+    params = list(inspect.signature(task.body).parameters.values())[1:]
+    entry = {
+        "doc": task.__doc__ or "",
+        "aliases": list(task.aliases),
+        "auto_shortflags": task.auto_shortflags,
+        "autoprint": task.autoprint,
+        "params": [
+            [param.name]
+            if param.default is param.empty
+            else [param.name, param.default]
+            for param in params
+        ],
+        "pre": [names[getattr(pre, "task", pre)] for pre in task.pre],
+        "post": [names[getattr(post, "task", post)] for post in task.post],
+    }
+    for field in TASK_FIELDS:
+        value = getattr(task, field)
+        entry[field] = dict(value) if field == "help" else list(value)
+    return entry
+
+
+def describe_collection(collection: Collection) -> dict:
+    """ A json friendly description of ``collection`` and its subcollections. """
+
+    names = {task: name for name, task in collection.tasks.items()}
+    return {
+        "default": collection.default,
+        "tasks": {name: describe_task(task, names) for name, task in collection.tasks.items()},
+        "collections": {
+            name: describe_collection(sub) for name, sub in collection.collections.items()
+        },
+    }
+
+
+def real_collection() -> Collection:
+    """ Import the task module and build the real namespace. """
+    from tskmstr import tasks  # pylint: disable=import-outside-toplevel
+
+    return Collection.from_module(tasks)
+
+
+def stand_in_body(path: str, entry: dict):
+    """ A task body with the real task's signature that runs the real task. """
+
+    def body(context, *args, **kwargs):
+        return real_collection()[path](context, *args, **kwargs)
+
+    params = [inspect.Parameter("context", inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+    for param in entry["params"]:
+        default = param[1] if len(param) > 1 else inspect.Parameter.empty
+        params.append(
+            inspect.Parameter(
+                param[0], inspect.Parameter.POSITIONAL_OR_KEYWORD, default=default
+            )
+        )
+
+    body.__doc__ = entry["doc"]
+    body.__name__ = path.split(".")[-1]
+    body.__signature__ = inspect.Signature(params)
+    return body
+
+
+def build_collection(manifest: dict, prefix: str = "") -> Collection:
+    """ Rebuild a namespace of stand-in tasks from ``manifest``. """
+
+    collection = Collection()
+    tasks = {}
+    for name, entry in manifest["tasks"].items():
+        tasks[name] = Task(
+            stand_in_body(prefix + name, entry),
+            name=name,
+            aliases=entry["aliases"],
+            auto_shortflags=entry["auto_shortflags"],
+            autoprint=entry["autoprint"],
+            default=name == manifest["default"],
+            **{field: entry[field] for field in TASK_FIELDS},
+        )
+
+    for name, task in tasks.items():
+        task.pre = [tasks[pre] for pre in manifest["tasks"][name]["pre"]]
+        task.post = [tasks[post] for post in manifest["tasks"][name]["post"]]
+        collection.add_task(task, name=name)
+
+    for name, sub in manifest["collections"].items():
+        collection.add_collection(build_collection(sub, f"{prefix}{name}."), name=name)
+
+    return collection
+
+
+def load_namespace() -> Collection:
+    """ The namespace from a fresh manifest, rebuilding the manifest if it is stale. """
+
+    if os.environ.get("TSKMSTR_NO_MANIFEST"):
+        return real_collection()
+
+    stamp = source_stamp()
+    try:
+        with open(MANIFEST_PATH) as in_file:
+            cached = json.load(in_file)
+        if cached["stamp"] == stamp:
+            return build_collection(cached["collection"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    collection = real_collection()
+    try:
+        atomic_write_json(
+            MANIFEST_PATH, {"stamp": stamp, "collection": describe_collection(collection)}
+        )
+    except (OSError, TypeError, KeyError):
+        # Unwritable cache, or a task default that json can't hold: skip the manifest.
+        pass
+
+    return collection
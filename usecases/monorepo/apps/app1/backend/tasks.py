@@ -3,33 +3,57 @@ import os
 import time
 
 from atdcoe_invoke import (
+    BENCH_APP,
+    PROFILES,
+    bench_gunicorn,
+    checks_exit_code,
     clean,
+    clone_databases,
+    cpu_count,
     cron_deploy,
     deploy,
     docker_build,
     docker_push,
     docker_run,
+    ensure_local_pg,
+    format_checks,
+    format_load_report,
+    gunicorn_command,
+    gunicorn_settings,
     init_atdcoe_tasks,
     install,
+    lint,
+    register_check,
+    reset_from_template,
     run,
+    run_checks,
+    run_test_shards,
     seed,
+    seed_tables,
+    spooled_run,
     test,
 )
-from invoke import task
+from invoke import Exit, task
 
 APP_NAME = "app1"
 
 init_atdcoe_tasks("app1", "app1")
 
 
-@task
-def analyze_bundle(ctx, prod=True):
+SPOOL_HELP = (
+    "Keep only the tail of the output in memory; the rest goes to a compressed "
+    + "log under .build_cache/logs"
+)
+
+
+@task(help={"spool": SPOOL_HELP})
+def analyze_bundle(ctx, prod=True, spool=False):
     """Analyze Angular bundle output"""
-    ctx.run(
-        f"ng build --project=app1 {'--prod' if prod else ''} --stats-json",
-        echo=True,
-        pty=True,
-    )
+    build = f"ng build --project=app1 {'--prod' if prod else ''} --stats-json"
+    if spool:
+        spooled_run(ctx, build, ".build_cache/logs/ng-build-app1.log.gz", echo=True)
+    else:
+        ctx.run(build, echo=True, pty=True)
     ctx.run(
         f"./node_modules/.bin/webpack-bundle-analyzer dist/apps/app1/stats.json",
         echo=True,
@@ -54,14 +78,17 @@ def start_fe(ctx, port="4200", prod=False):
     )
 
 
-@task
-def start_local_pg(ctx):
-    ctx.run(
-        f"docker-compose -f {APP_DIR}/docker-compose-test.yaml up -d",
-        pty=True,
-        echo=True,
+@task(
+    help={
+        "port": "Port the test Postgres listens on",
+        "timeout": "Seconds to wait for Postgres to answer",
+    }
+)
+def start_local_pg(ctx, port=5432, timeout=60):
+    """Start the test Postgres unless it is already running, and wait for it"""
+    ensure_local_pg(
+        ctx, f"{APP_DIR}/docker-compose-test.yaml", port=port, timeout=timeout
     )
-    time.sleep(3)
 
 
 @task
@@ -82,16 +109,34 @@ def destroy_local_pg(ctx):
     )
 
 
-@task
-def start_be(ctx, wsgi_server=False, config_name="dev", host="127.0.0.1"):
+WSGI_HELP = {
+    "profile": f"How to size gunicorn: {', '.join(PROFILES)}",
+    "workers": "Worker processes (default: from the profile and CPU count)",
+    "threads": "Threads per worker (default: from the profile)",
+}
+
+
+@task(help=WSGI_HELP)
+def start_be(
+    ctx,
+    wsgi_server=False,
+    config_name="dev",
+    host="127.0.0.1",
+    profile="cpu",
+    workers=0,
+    threads=0,
+):
     """Start the backend as a dev server or production ready gunicorn server"""
     if config_name == "test":
         start_local_pg(ctx)
 
     if wsgi_server:
+        settings = gunicorn_settings(profile, workers, threads)
         with ctx.cd(TASK_DIR):
             ctx.run(
-                f"""gunicorn --bind {host}:5000 --workers 2 "app:create_app('{config_name}')" """,
+                gunicorn_command(
+                    f"app:create_app('{config_name}')", f"{host}:5000", settings
+                ),
                 pty=True,
                 echo=True,
             )
@@ -108,11 +153,69 @@ def start_be(ctx, wsgi_server=False, config_name="dev", host="127.0.0.1"):
     )
 
 
-@task
-def init_db(ctx, config_name="dev"):
+@task(
+    help=dict(
+        WSGI_HELP,
+        profile="Profile to benchmark (default: all of them)",
+        requests="Requests to send per run",
+        concurrency="Concurrent keep-alive clients",
+        io_ms="Milliseconds each request waits, like a database query",
+        cpu_rounds="Hashing rounds each request spends on the CPU",
+    )
+)
+def bench_be(
+    ctx,  # pylint: disable=unused-argument
+    profile="",
+    workers=0,
+    threads=0,
+    requests=2000,
+    concurrency=16,
+    io_ms=5.0,
+    cpu_rounds=2000,
+    port=5055,
+):
+    """Benchmark gunicorn settings against a stand-in app, to size workers"""
+    env = {"BENCH_APP_IO_MS": str(io_ms), "BENCH_APP_CPU_ROUNDS": str(cpu_rounds)}
+    print(f"{cpu_count()} CPUs, {requests} requests from {concurrency} clients")
+
+    for name in [profile] if profile else list(PROFILES):
+        settings = gunicorn_settings(name, workers, threads)
+        command = gunicorn_command(BENCH_APP, f"127.0.0.1:{port}", settings)
+        result = bench_gunicorn(
+            command, "127.0.0.1", port, "/", requests, concurrency, env
+        )
+        print(f"{name:>4}: {format_load_report(settings, result)}")
+
+
+def build_db(app, config_name):
+    """Create the schemas and tables of a fresh database"""
+    from app import db
+    from task_util.seed_util import drop_app_tables
+
+    db.session.execute("CREATE SCHEMA IF NOT EXISTS a;")
+    db.session.execute("CREATE SCHEMA IF NOT EXISTS b;")
+    db.session.execute("CREATE SCHEMA IF NOT EXISTS c;")
+    db.session.execute("CREATE SCHEMA IF NOT EXISTS d;")
+
+    db.session.commit()
+
+    if config_name == "test":
+        db.drop_all(app=app)
+    else:
+        drop_app_tables(db.engine)
+
+    db.create_all(app=app)
+    db.session.remove()
+
+
+@task(
+    help={
+        "snapshot": "Reset the test database from a template of the current models"
+    }
+)
+def init_db(ctx, config_name="dev", snapshot=False):
     """Initialize Database"""
     from app import db, create_app
-    from task_util.seed_util import drop_app_tables
 
     print("Config Name:", config_name)
 
@@ -122,23 +225,27 @@ def init_db(ctx, config_name="dev"):
     app = create_app(config_name)
 
     with app.app_context():
-        db.session.execute("CREATE SCHEMA IF NOT EXISTS a;")
-        db.session.execute("CREATE SCHEMA IF NOT EXISTS b;")
-        db.session.execute("CREATE SCHEMA IF NOT EXISTS c;")
-        db.session.execute("CREATE SCHEMA IF NOT EXISTS d;")
-
-        db.session.commit()
-
-        if config_name == "test":
-            db.drop_all(app=app)
+        # Only the test database is disposable enough to be replaced wholesale.
+        if snapshot and config_name == "test":
+            reset_from_template(
+                db.engine, db.metadata, lambda: build_db(app, config_name)
+            )
         else:
-            drop_app_tables(db.engine)
+            build_db(app, config_name)
 
-        db.create_all(app=app)
 
+# Model table names of the seeded entities, for `seed_db --bulk`.
+SEED_TABLES = {"A": "common_A_t", "B": "common_B_t", "C": "common_C_t"}
 
-@task
-def seed_db(ctx, config_name="dev"):
+
+@task(
+    help={
+        "bulk": "Bulk load the seed csvs, several tables at a time",
+        "jobs": "Tables to load at once in bulk mode",
+        "batch_size": "Rows per insert batch in bulk mode, where COPY isn't available",
+    }
+)
+def seed_db(ctx, config_name="dev", bulk=False, jobs=4, batch_size=10000):
     """Initialize Database"""
     from app import db, create_app, guard
     from task_util.seed_util import (
@@ -161,37 +268,138 @@ def seed_db(ctx, config_name="dev"):
     app = create_app(config_name)
 
     with app.app_context():
-        # Seed A
-        seed_entity(db, "A", A_DATA)
-        # Seed B
-        seed_entity(db, "B", B_DATA)
-        # Seed C
-        seed_entity(db, "C", C_DATA)
+        if bulk:
+            # The table each seed csv loads into, as declared by the models;
+            # every csv has a header row naming the columns.
+            tables = db.metadata.tables
+            seed_tables(
+                db.engine,
+                {
+                    tables[SEED_TABLES["A"]]: A_DATA,
+                    tables[SEED_TABLES["B"]]: B_DATA,
+                    tables[SEED_TABLES["C"]]: C_DATA,
+                },
+                jobs=jobs,
+                batch_size=batch_size,
+            )
+        else:
+            # Seed A
+            seed_entity(db, "A", A_DATA)
+            # Seed B
+            seed_entity(db, "B", B_DATA)
+            # Seed C
+            seed_entity(db, "C", C_DATA)
 
         set_app_user_perms(db)
 
 
-@task
-def test_be(ctx):
+def test_be_command():
+    return f"pytest {APP_DIR}/backend"
+
+
+def mypy_command():
+    return f"mypy {APP_DIR}/backend/app --ignore-missing-imports"
+
+
+def pylint_command():
+    return f"pylint {APP_DIR}/backend/app"
+
+
+register_check(APP_NAME, "test_be", test_be_command)
+register_check(APP_NAME, "mypy", mypy_command)
+register_check(APP_NAME, "pylint", pylint_command)
+
+
+def test_shard_envs(ctx, count):
+    """A test database per shard, cloned from the test template
+
+    The test config connects to TEST_DATABASE_URL when it is set, so each
+    shard's tests only ever see their own database.
+    """
+    from app import db, create_app
+
+    start_local_pg(ctx)
+    app = create_app("test")
+
+    with app.app_context():
+        urls = clone_databases(
+            db.engine, db.metadata, lambda: build_db(app, "test"), count
+        )
+    return [{"TEST_DATABASE_URL": url} for url in urls]
+
+
+@task(
+    help={
+        "shards": "Split the suite across this many pytest processes, balanced by "
+        + "the durations of earlier runs",
+        "spool": SPOOL_HELP,
+    }
+)
+def test_be(ctx, shards=0, spool=False):
     """Test Python Backend"""
-    ctx.run(f"pytest {APP_DIR}/backend", pty=True)
+    if shards:
+        code = run_test_shards(
+            ctx,
+            f"{APP_DIR}/backend",
+            shards,
+            f"{APP_DIR}/backend/.build_cache/test_durations.json",
+            f"{APP_DIR}/backend/.build_cache/junit.xml",
+            shard_envs=lambda count: test_shard_envs(ctx, count),
+        )
+        if code:
+            raise Exit("Backend tests failed", code=code)
+        return
+
+    if spool:
+        spooled_run(
+            ctx,
+            test_be_command(),
+            f"{APP_DIR}/backend/.build_cache/logs/pytest.log.gz",
+            pty=True,
+        )
+        return
 
+    ctx.run(test_be_command(), pty=True)
 
-@task
-def mypy(ctx):
+
+@task(help={"cache": "Only re-check files changed since the last run"})
+def mypy(ctx, cache=False):
     """Run MyPy linting on app1"""
-    ctx.run(f"mypy {APP_DIR}/backend/app --ignore-missing-imports", pty=True)
+    if cache:
+        lint(ctx, tool="mypy", path=f"{APP_DIR}/backend")
+        return
 
+    ctx.run(mypy_command(), pty=True)
 
-@task
-def pylint(ctx):
+
+@task(help={"cache": "Only re-check files changed since the last run"})
+def pylint(ctx, cache=False):
     """Run Pylint on app1"""
-    ctx.run(f"pylint {APP_DIR}/backend/app", pty=True)
+    if cache:
+        lint(ctx, tool="pylint", path=f"{APP_DIR}/backend")
+        return
 
+    ctx.run(pylint_command(), pty=True)
 
-@task
-def test_all(ctx):
+
+@task(
+    help={
+        "parallel": "Run the checks at the same time, printing each one's output "
+        + "when it finishes",
+        "jobs": "Checks to run at once in parallel mode (default: all)",
+    }
+)
+def test_all(ctx, parallel=False, jobs=0):
     """Run all maintenance testing for app1"""
+    if parallel:
+        start = time.time()
+        results = run_checks(ctx, APP_NAME, jobs)
+        print(format_checks(results, time.time() - start))
+        code = checks_exit_code(results)
+        if code:
+            raise Exit("Some checks failed", code=code)
+        return
+
     print("Backend Testing...")
     test_be(ctx)
     print("mypy...")
@@ -6,148 +6,323 @@
 # pylint: disable=import-outside-toplevel
 
 import os
-import subprocess
-
-from atdcoe_invoke import (clean, cron_deploy, deploy, docker_build,
-                           docker_push, docker_run, get_app_dir,
-                           init_atdcoe_tasks, install, run, seed, test)
-from invoke import task
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+from atdcoe_invoke import (Checkpoint, bigquery_source, checks_exit_code,
+                           clean, cloud_sql_proxy, cron_deploy, csv_source,
+                           deploy, docker_build, docker_push, docker_run,
+                           format_checks, get_app_dir, incremental_run,
+                           init_atdcoe_tasks, install, lint, process_cwd,
+                           register_check, run, run_checks, run_shards, seed,
+                           shared_app_context, stream_import, test)
+from invoke import Exit, task
 
 init_atdcoe_tasks("app2", "app2")
 
+CONTAINER_PATH = "/app"
 
-@task
+# How the prod config reaches the database through the proxy. "socket" serves
+# the instance at /cloudsql/a, where the prod config connects. "tcp" serves it
+# on 127.0.0.1:5432 instead, for a prod config pointed there.
+CLOUD_SQL_PROXY_MODE = os.environ.get("CLOUD_SQL_PROXY_MODE", "socket")
+CLOUD_SQL_SOCKET_DIR = "/cloudsql"
+CLOUD_SQL_PORT = 5432
+CLOUD_SQL_INSTANCE = f"a=tcp:{CLOUD_SQL_PORT}" if CLOUD_SQL_PROXY_MODE == "tcp" else "a"
+
+CLOUD_SQL_PROXY = [
+    f"{CONTAINER_PATH}/cloud_sql_proxy",
+    f"-instances={CLOUD_SQL_INSTANCE}",
+    f"-dir={CLOUD_SQL_SOCKET_DIR}",
+    f"-credential_file={CONTAINER_PATH}/secrets/a.json",
+]
+
+
+def get_run_from_path(run_from_container):
+    """ Where the backend lives, in the container or in the checkout. """
+    if run_from_container:
+        return CONTAINER_PATH
+    # Absolute, so nested etl_context calls don't resolve it twice.
+    return os.path.abspath(os.path.join(get_app_dir(), "backend"))
+
+
+def test_command():
+    """ The test runner only finds the app from the backend directory. """
+    return f"cd {get_run_from_path(False)} && python manage.py test"
+
+
+def pylint_command():
+    """ pylint on the app package, from wherever inv runs. """
+    return f"pylint {get_app_dir()}/backend/app"
+
+
+register_check("app2", "test", test_command)
+register_check("app2", "pylint", pylint_command)
+
+
+def container_proxy(run_from_container):
+    """ The shared cloud_sql_proxy when running in the container, else a no-op. """
+    if not run_from_container:
+        return nullcontext()
+    if CLOUD_SQL_PROXY_MODE == "tcp":
+        return cloud_sql_proxy(CLOUD_SQL_PROXY, port=CLOUD_SQL_PORT)
+    # Postgres clients connect to the .s.PGSQL.<port> socket in the directory.
+    return cloud_sql_proxy(
+        CLOUD_SQL_PROXY,
+        socket_path=f"{CLOUD_SQL_SOCKET_DIR}/a/.s.PGSQL.{CLOUD_SQL_PORT}",
+    )
+
+
+def dispose_db(app):  # pylint: disable=unused-argument
+    """ Release the session and connection pool once the task chain is done. """
+    from app import db
+
+    db.session.remove()
+    db.engine.dispose()
+
+
+@contextmanager
+def etl_context(ctx, run_from_container):
+    """
+    Proxy, working directory and prod app context for an ETL task.
+
+    Chained tasks nest inside each other's etl_context, so the proxy, the app
+    and its connection pool are set up once and torn down once. The app opens
+    its config and secrets relative to the process cwd, so this moves the
+    process there; concurrent ETL tasks all share that same directory.
+    """
+    run_from_path = get_run_from_path(run_from_container)
+
+    with container_proxy(run_from_container), process_cwd(run_from_path, ctx):
+        from app import create_app
+
+        with shared_app_context(create_app, "prod", teardown=dispose_db) as app:
+            yield app
+
+
+# Incremental refreshes rely on two hooks in app.utils:
+#   get_ruleset_definition(kind, name) -> json friendly description of a ruleset
+#   populate_*_cache(..., since=datetime) -> only recompute entries whose
+#       products, styles or rules changed after ``since``
+# and on the etl_* state tables, which app.models adds with
+# add_etl_tables(db.metadata) so the app's migrations create them.
+INCREMENTAL_HELP = "Only refresh entries changed since the last run"
+
+
+@task(help={"incremental": INCREMENTAL_HELP})
 def populate_caches(
     ctx,
     sku_ruleset_name="default",
     style_ruleset_name="default",
     run_from_container=False,
+    incremental=False,
 ):
     """ Run both of the cache loading scripts. """
-    populate_sku_cache(ctx, sku_ruleset_name, run_from_container)
-    populate_style_cache(ctx, sku_ruleset_name, style_ruleset_name, run_from_container)
 
-
-@task
-def populate_sku_cache(ctx, sku_ruleset_name="default", run_from_container=False):
-    """ Run the cache ETL jobs. """
-
-    if run_from_container:
-        run_from_path = "/app"
-
-        subprocess.Popen(
-            [
-                "/app/cloud_sql_proxy",
-                "-instances=a",
-                f"-credential_file={run_from_path}/secrets/a.json",
-            ]
+    # Both jobs share one proxy and one application.
+    with etl_context(ctx, run_from_container):
+        populate_sku_cache(
+            ctx, sku_ruleset_name, run_from_container, incremental=incremental
         )
-    else:
-        run_from_path = os.path.join(get_app_dir(), "backend")
+        populate_style_cache(
+            ctx,
+            sku_ruleset_name,
+            style_ruleset_name,
+            run_from_container,
+            incremental=incremental,
+        )
+
 
-    with ctx.cd(run_from_path):
-        os.chdir(run_from_path)
+def sku_cache_shard(run_from_path, sku_ruleset_name, shard, shard_count):
+    """
+    Build one shard of the sku to sku cache in a pool worker.
 
+    Each worker creates its own app, so it never uses connections inherited
+    from the parent. The app's populate_sku_cache is expected to take
+    ``shard`` and ``shard_count`` and handle only the skus in that shard
+    (e.g. ``sku_id % shard_count == shard``), returning the rows it wrote.
+    """
+    with process_cwd(run_from_path):
         from app import create_app
         from app.utils import populate_sku_cache as pop_sku_cache
 
-        print("Creating application.")
         app = create_app("prod")
-
         with app.app_context():
-            print("Populating sku to sku cache.")
+            try:
+                return pop_sku_cache(
+                    sku_ruleset_name, shard=shard, shard_count=shard_count
+                )
+            finally:
+                dispose_db(app)
+
+
+@task(
+    help={
+        "shards": "Split the sku key space into this many shards (0 runs serially)",
+        "jobs": "How many shards to run at the same time",
+        "restart": "Ignore shards finished by an earlier, interrupted run",
+        "max_age_hours": "Only resume an interrupted run started this recently",
+        "incremental": INCREMENTAL_HELP,
+    }
+)
+def populate_sku_cache(
+    ctx,
+    sku_ruleset_name="default",
+    run_from_container=False,
+    shards=0,
+    jobs=4,
+    restart=False,
+    max_age_hours=6,
+    incremental=False,
+):
+    """ Run the cache ETL jobs. """
+
+    if shards:
+        run_from_path = get_run_from_path(run_from_container)
+        checkpoint = Checkpoint(
+            os.path.join(run_from_path, ".checkpoints", f"sku_cache-{sku_ruleset_name}.json"),
+            f"sku_cache:{sku_ruleset_name}:{shards}",
+            # A crashed run's shards are only worth keeping until the next
+            # scheduled run, which should start from fresh data.
+            max_age=max_age_hours * 3600,
+        )
+        if restart:
+            checkpoint.clear()
+
+        with container_proxy(run_from_container):
+            run_shards(
+                partial(sku_cache_shard, run_from_path, sku_ruleset_name),
+                shards,
+                jobs,
+                checkpoint,
+            )
+        return
+
+    with etl_context(ctx, run_from_container):
+        from app import db
+        from app.utils import get_ruleset_definition
+        from app.utils import populate_sku_cache as pop_sku_cache
+
+        print("Populating sku to sku cache.")
+        if not incremental:
             pop_sku_cache(sku_ruleset_name)
+            return
 
+        with incremental_run(
+            db.session,
+            f"sku_cache:{sku_ruleset_name}",
+            get_ruleset_definition("sku", sku_ruleset_name),
+        ) as since:
+            pop_sku_cache(sku_ruleset_name, since=since)
 
-@task
+
+@task(help={"incremental": INCREMENTAL_HELP})
 def populate_style_cache(
     ctx,
     sku_ruleset_name="default",
     style_ruleset_name="default",
     run_from_container=False,
+    incremental=False,
 ):
     """ Run the cache ETL jobs. """
 
-    if run_from_container:
-        run_from_path = "/app"
-
-        subprocess.Popen(
-            [
-                "/app/cloud_sql_proxy",
-                "-instances=a",
-                f"-credential_file={run_from_path}/secrets/a.json",
-            ]
-        )
-    else:
-        run_from_path = os.path.join(get_app_dir(), "backend")
-
-    with ctx.cd(run_from_path):
-        os.chdir(run_from_path)
-
-        from app import create_app
+    with etl_context(ctx, run_from_container):
+        from app import db
+        from app.utils import get_ruleset_definition
         from app.utils import populate_style_cache as pop_style_cache
 
-        print("Creating application.")
-        app = create_app("prod")
-
-        with app.app_context():
-            print("Populating style to style cache.")
+        print("Populating style to style cache.")
+        if not incremental:
             pop_style_cache(sku_ruleset_name, style_ruleset_name)
+            return
+
+        # The style cache is built from both rulesets, so either changing
+        # forces a full rebuild.
+        with incremental_run(
+            db.session,
+            f"style_cache:{sku_ruleset_name}:{style_ruleset_name}",
+            {
+                "sku": get_ruleset_definition("sku", sku_ruleset_name),
+                "style": get_ruleset_definition("style", style_ruleset_name),
+            },
+        ) as since:
+            pop_style_cache(sku_ruleset_name, style_ruleset_name, since=since)
+
+
+@task(
+    help={
+        "streaming": "Page the source and load it in fixed-size batches",
+        "batch_size": "Rows per batch in streaming mode",
+        "resume": "Continue a streaming import after its last committed batch",
+        "source_file": "Read prices from this local csv instead of BigQuery",
+    }
+)
+def import_prices(
+    ctx,
+    run_from_container=False,
+    streaming=False,
+    batch_size=10000,
+    resume=False,
+    source_file="",
+):
+    """
+    Load retail prices from BigQuery.
 
+    Streaming mode needs app.utils.retail_price_import_spec() to return a dict
+    with the BigQuery "query" (ordered by a unique key, so it can be resumed),
+    the target "table" and "columns", and a "convert" function from a source
+    row to a dict of those columns. Reloading needs a "replace(session)" that
+    deletes or truncates the rows of earlier imports; it runs in the same
+    transaction as the first batch.
+    """
 
-@task
-def import_prices(ctx, run_from_container=False):
-    """ Load retail prices from BigQuery. """
-
-    if run_from_container:
-        run_from_path = "/app"
-
-        subprocess.Popen(
-            [
-                "/app/cloud_sql_proxy",
-                "-instances=a",
-                f"-credential_file={run_from_path}/secrets/a.json",
-            ]
-        )
-    else:
-        run_from_path = os.path.join(get_app_dir(), "backend")
-
-    with ctx.cd(run_from_path):
-        os.chdir(run_from_path)
-
-        from app import create_app
-        from app.utils import import_retail_prices
-
-        app = create_app("prod")
+    with etl_context(ctx, run_from_container):
+        if not streaming:
+            from app.utils import import_retail_prices
 
-        with app.app_context():
             import_retail_prices()
+            return
+
+        from app import db
+        from app.utils import retail_price_import_spec
+
+        spec = retail_price_import_spec()
+        if source_file:
+            source = partial(csv_source, source_file)
+        else:
+            source = partial(bigquery_source, spec["query"], page_size=batch_size)
+
+        stream_import(
+            db.session,
+            "retail_prices",
+            lambda start: source(start=start),
+            spec["convert"],
+            spec["table"],
+            spec["columns"],
+            batch_size=batch_size,
+            resume=resume,
+            replace=spec.get("replace"),
+        )
 
 
 @task
 def populate_style_master(ctx, run_from_container=False):
     """ Populate the style master table from the product master table. """
 
-    if run_from_container:
-        run_from_path = "/app"
-
-        subprocess.Popen(
-            [
-                "/app/cloud_sql_proxy",
-                "-instances=a",
-                f"-credential_file={run_from_path}/secrets/a.json",
-            ]
-        )
-    else:
-        run_from_path = os.path.join(get_app_dir(), "backend")
+    with etl_context(ctx, run_from_container):
+        from app.utils import populate_styles_table
 
-    with ctx.cd(run_from_path):
-        os.chdir(run_from_path)
+        populate_styles_table()
 
-        from app import create_app
-        from app.utils import populate_styles_table
 
-        app = create_app("prod")
+@task(help={"jobs": "Checks to run at once (default: all)"})
+def test_all(ctx, jobs=0):
+    """ Run the tests and linters at the same time. """
 
-        with app.app_context():
-            populate_styles_table()
+    start = time.time()
+    results = run_checks(ctx, "app2", jobs)
+    print(format_checks(results, time.time() - start))
+    code = checks_exit_code(results)
+    if code:
+        raise Exit("Some checks failed", code=code)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Compare row by row seeding against `seed_tables` on synthetic csv files.
+
+Three tables are generated at each size: two independent ones and a third
+with a foreign key to the first. Pass a SQLAlchemy url to benchmark a real
+database; the default is a throwaway SQLite file.
+
+    $ python bench_seed.py [url] [sizes, e.g. 1000,10000,100000]
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+
+from monorepo_invoke.seeding import seed_tables
+
+SCHEMA = [
+    "CREATE TABLE bench_a (id INTEGER PRIMARY KEY, name VARCHAR(50), price FLOAT)",
+    "CREATE TABLE bench_b (id INTEGER PRIMARY KEY, name VARCHAR(50), price FLOAT)",
+    "CREATE TABLE bench_c (id INTEGER PRIMARY KEY, "
+    + "a_id INTEGER REFERENCES bench_a (id), name VARCHAR(50))",
+]
+
+
+def write_csvs(directory: str, size: int) -> dict:
+    """ Synthetic csv files for the bench tables, ``size`` rows each. """
+
+    rows = {
+        "bench_a": (["id", "name", "price"], lambda i: [i, f"a-{i}", i * 0.5]),
+        "bench_b": (["id", "name", "price"], lambda i: [i, f"b-{i}", i * 1.5]),
+        "bench_c": (["id", "a_id", "name"], lambda i: [i, i, f"c-{i}"]),
+    }
+
+    files = {}
+    for table, (header, make_row) in rows.items():
+        path = files[table] = os.path.join(directory, f"{table}.csv")
+        with open(path, "w", newline="") as out_file:
+            writer = csv.writer(out_file)
+            writer.writerow(header)
+            writer.writerows(make_row(i) for i in range(size))
+    return files
+
+
+def reset(engine) -> None:
+    """ Recreate the bench tables, empty. """
+
+    with engine.begin() as connection:
+        for table in ("bench_c", "bench_b", "bench_a"):
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+
+
+def row_by_row(engine, files: dict) -> None:
+    """ The baseline: one INSERT per row, one table after another. """
+
+    with engine.begin() as connection:
+        for table, path in files.items():
+            with open(path, newline="") as in_file:
+                reader = csv.reader(in_file)
+                columns = next(reader)
+                insert = text(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    + f"VALUES ({', '.join(':' + column for column in columns)})"
+                )
+                for row in reader:
+                    connection.execute(insert, dict(zip(columns, row)))
+
+
+def main(url: str = "", sizes=(1000, 10000, 100000)) -> None:
+    """ Print seconds and rows per second for both approaches at each size. """
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(url or f"sqlite:///{directory}/bench.db")
+
+        for size in sizes:
+            files = write_csvs(directory, size)
+            for label, seed in (
+                ("row by row", row_by_row),
+                ("seed_tables", lambda engine, files: seed_tables(engine, files)),
+            ):
+                reset(engine)
+                start = time.perf_counter()
+                seed(engine, files)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{size:>8} rows/table {label:>12}: {elapsed:.2f}s "
+                    + f"({len(files) * size / elapsed:.0f} rows/s)"
+                )
+
+        reset(engine)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        main(sys.argv[1], [int(size) for size in sys.argv[2].split(",")])
+    else:
+        main(sys.argv[1] if len(sys.argv) > 1 else "")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Fail if `import monorepo_invoke` gets slower than a budget.
+
+Runs `python -X importtime -c "import monorepo_invoke"` in a fresh interpreter
+and reads the package's cumulative import time. It also fails if the import
+pulls in modules that should only load when a task is used.
+
+    $ python check_import_time.py [budget_ms]
+"""
+
+import subprocess
+import sys
+
+BUDGET_MS = 30.0
+
+# Modules that must not be imported by `import monorepo_invoke` alone.
+HEAVY_MODULES = ("invoke", "dotenv", "ruamel")
+
+
+def measure() -> float:
+    """ Cumulative import time of monorepo_invoke in milliseconds. """
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import monorepo_invoke"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "monorepo_invoke":
+            return int(fields[1]) / 1000
+
+    raise RuntimeError("monorepo_invoke did not show up in -X importtime output")
+
+
+def heavy_imports() -> list:
+    """ Which of HEAVY_MODULES get imported by `import monorepo_invoke`. """
+
+    check = (
+        "import sys, monorepo_invoke; "
+        + f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", check],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    return proc.stdout.split()
+
+
+def main(budget_ms: float = BUDGET_MS) -> int:
+    """ Report the import time, returning a non-zero exit code when over budget. """
+
+    # Best of a few runs, to keep noise on busy CI machines out of the result.
+    elapsed = min(measure() for _ in range(5))
+    heavy = heavy_imports()
+
+    print(f"import monorepo_invoke: {elapsed:.1f} ms (budget {budget_ms:.1f} ms)")
+    if heavy:
+        print(f"import monorepo_invoke eagerly imports: {', '.join(heavy)}")
+
+    return 1 if elapsed > budget_ms or heavy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else BUDGET_MS))
@@ -1,25 +1,91 @@
-""" Barrel for gathering all features. """
-
-from .tasks import (
-    clean,
-    cron_deploy,
-    deploy,
-    docker_build,
-    docker_push,
-    docker_run,
-    get_app_dir,
-    get_app_name,
-    get_base_dir,
-    get_default_secrets_path,
-    get_gcr_hostname,
-    get_image_name,
-    get_project,
-    init_monorepo_tasks,
-    install,
-    run,
-    seed,
-    test,
-    validate_env,
+""" Barrel for gathering all features.
+
+Names from `.tasks` pull in invoke and dotenv, so they are imported lazily on
+first attribute access; `import monorepo_invoke` on its own stays cheap.
+"""
+
+from importlib import import_module
+
+# Cheap, standard library only. Imported eagerly so the names refer to the
+# helpers rather than the submodules of the same name.
+from .tmp_copy import tmp_copy, tmp_stage
+from .tmp_cwd import cwd_open, cwd_path, get_cwd, process_cwd, scoped_cwd, tmp_cwd
+
+_LAZY = {
+    "BENCH_APP": ".wsgi_tuning",
+    "Checkpoint": ".shards",
+    "Fingerprint": ".fingerprint",
+    "PROFILES": ".wsgi_tuning",
+    "add_etl_tables": ".etl_state",
+    "bench_gunicorn": ".wsgi_tuning",
+    "bigquery_source": ".batch_import",
+    "checks_exit_code": ".checks",
+    "clean": ".tasks",
+    "clone_databases": ".db_template",
+    "cloud_sql_proxy": ".sql_proxy",
+    "cpu_count": ".wsgi_tuning",
+    "cron_deploy": ".tasks",
+    "csv_source": ".batch_import",
+    "deploy": ".tasks",
+    "docker_build": ".tasks",
+    "docker_push": ".tasks",
+    "docker_run": ".tasks",
+    "ensure_local_pg": ".local_pg",
+    "format_checks": ".checks",
+    "format_load_report": ".wsgi_tuning",
+    "get_app_dir": ".tasks",
+    "get_app_name": ".tasks",
+    "get_base_dir": ".tasks",
+    "get_default_secrets_path": ".tasks",
+    "get_gcr_hostname": ".tasks",
+    "get_image_name": ".tasks",
+    "get_project": ".tasks",
+    "gunicorn_command": ".wsgi_tuning",
+    "gunicorn_settings": ".wsgi_tuning",
+    "incremental_run": ".watermark",
+    "init_monorepo_tasks": ".tasks",
+    "install": ".tasks",
+    "lint": ".tasks",
+    "register_check": ".checks",
+    "reset_from_template": ".db_template",
+    "run": ".tasks",
+    "run_checks": ".checks",
+    "run_shards": ".shards",
+    "run_test_shards": ".pytest_shards",
+    "seed": ".tasks",
+    "seed_tables": ".seeding",
+    "shared_app_context": ".app_context",
+    "span": ".tracing",
+    "spooled_lines": ".spool",
+    "spooled_run": ".spool",
+    "stream_import": ".batch_import",
+    "test": ".tasks",
+    "validate_env": ".tasks",
+}
+
+__all__ = sorted(
+    list(_LAZY)
+    + [
+        "cwd_open",
+        "cwd_path",
+        "get_cwd",
+        "process_cwd",
+        "scoped_cwd",
+        "tmp_copy",
+        "tmp_cwd",
+        "tmp_stage",
+    ]
 )
-from .tmp_copy import tmp_copy
-from .tmp_cwd import tmp_cwd
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
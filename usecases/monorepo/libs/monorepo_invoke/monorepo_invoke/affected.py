@@ -0,0 +1,71 @@
+""" Work out which monorepo apps are affected by a change, and run tasks for them. """
+
+import os
+from typing import Dict, Iterable, List
+
+from .captured import print_block, run_captured, run_concurrently
+
+# Changes under these paths affect every app.
+SHARED_PATHS = ("libs/",)
+
+
+def list_apps(base_dir: str) -> List[str]:
+    """ Names of the apps under ``{base_dir}/apps``. """
+
+    apps_dir = os.path.join(base_dir, "apps")
+    return sorted(
+        name
+        for name in os.listdir(apps_dir)
+        if os.path.isdir(os.path.join(apps_dir, name))
+    )
+
+
+def changed_paths(ctx, ref: str = "origin/master") -> List[str]:
+    """ Paths changed in the working tree relative to ``ref``, untracked included. """
+
+    diff = ctx.run(f"git diff --name-only --relative {ref}", hide=True).stdout
+    untracked = ctx.run("git ls-files --others --exclude-standard", hide=True).stdout
+
+    return sorted(set(diff.split()) | set(untracked.split()))
+
+
+def affected_apps(paths: Iterable[str], apps: Iterable[str]) -> List[str]:
+    """ Map changed ``paths`` (relative to the monorepo root) to the apps they affect. """
+
+    apps = list(apps)
+    affected = set()
+
+    for path in paths:
+        path = path.replace(os.sep, "/")
+        if path.startswith(SHARED_PATHS):
+            return apps
+
+        parts = path.split("/")
+        if len(parts) > 2 and parts[0] == "apps" and parts[1] in apps:
+            affected.add(parts[1])
+
+    return [app for app in apps if app in affected]
+
+
+def app_task_command(app: str, task_args: str) -> str:
+    """ Command line that runs ``task_args`` with the tasks of ``app``. """
+    return f"inv --search-root apps/{app}/backend {task_args}"
+
+
+def run_for_apps(ctx, apps: List[str], task_name: str, jobs: int = 4) -> Dict[str, bool]:
+    """
+    Run ``inv task_name`` for each app, up to ``jobs`` apps at a time.
+
+    Each app's output is captured and printed as one block when it finishes.
+    Returns a mapping of app name to whether its task succeeded.
+    """
+
+    def run_one(app):
+        run = run_captured(ctx, app_task_command(app, task_name))
+        status = "ok" if run.ok else f"failed ({run.exited})"
+        print_block(
+            f"===== {app}: {task_name} {status} in {run.seconds:.1f}s =====", run.output
+        )
+        return run.ok
+
+    return dict(zip(apps, run_concurrently(run_one, apps, max(1, jobs))))
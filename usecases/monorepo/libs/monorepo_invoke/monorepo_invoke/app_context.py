@@ -0,0 +1,80 @@
+""" Share one Flask app and app context across a chain of tasks. """
+
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Tuple
+
+
+class SharedApp:  # pylint: disable=too-few-public-methods
+    """ An app created once for an invocation, who uses it and how often. """
+
+    def __init__(self, app, create_seconds: float, teardown: Callable = None):
+        self.app = app
+        self.create_seconds = create_seconds
+        self.teardown = teardown
+        self.users = 0
+        self.reuses = 0
+
+
+# Apps are shared by the whole process, so threads and asyncio tasks running
+# chained tasks side by side use one app and one connection pool.
+_SHARED: Dict[Tuple[Callable, str], SharedApp] = {}
+_SHARED_LOCK = threading.Lock()
+
+# Flask app contexts are local to a thread or asyncio task, so whether one is
+# pushed for a shared app is tracked per context too.
+_PUSHED: ContextVar = ContextVar("monorepo_invoke_pushed_apps", default=frozenset())
+
+
+@contextmanager
+def shared_app_context(
+    create_app: Callable, config_name: str = "prod", teardown: Callable = None
+):
+    """
+    Run inside an app context that is shared by every nested or concurrent use.
+
+    The first use calls ``create_app(config_name)``; later uses with the same
+    factory and config, nested or from other threads and asyncio tasks, reuse
+    the app, pushing its app context where the current thread or task has none
+    yet. When the last use exits, ``teardown(app)`` (the first use's) is called
+    once, and a report shows the startup time saved by the reuse.
+    """
+
+    key = (create_app, config_name)
+    with _SHARED_LOCK:
+        shared = _SHARED.get(key)
+        if shared is None:
+            print("Creating application.")
+            start = time.time()
+            app = create_app(config_name)
+            shared = _SHARED[key] = SharedApp(app, time.time() - start, teardown)
+        else:
+            shared.reuses += 1
+        shared.users += 1
+
+    with ExitStack() as stack:
+        if key not in _PUSHED.get():
+            stack.enter_context(shared.app.app_context())
+            token = _PUSHED.set(_PUSHED.get() | {key})
+            stack.callback(_PUSHED.reset, token)
+
+        try:
+            yield shared.app
+        finally:
+            with _SHARED_LOCK:
+                shared.users -= 1
+                last = not shared.users
+                if last:
+                    del _SHARED[key]
+            if last:
+                try:
+                    if shared.teardown is not None:
+                        shared.teardown(shared.app)
+                finally:
+                    print(
+                        f"Application created once in {shared.create_seconds:.2f}s "
+                        + f"and reused {shared.reuses} times, saving about "
+                        + f"{shared.create_seconds * shared.reuses:.2f}s of startup."
+                    )
@@ -0,0 +1,174 @@
+""" Stream rows from a paged source into a database table in fixed-size batches.
+
+Progress is kept in the `etl_import_progress` table, which the app's
+migrations create; see `etl_state`.
+"""
+
+import csv
+import io
+import re
+import time
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+def batched(rows: Iterable, size: int) -> Iterator[List]:
+    """ Split ``rows`` into lists of at most ``size`` items, lazily. """
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_source(path: str, start: int = 0) -> Iterator[dict]:
+    """ Rows of a local csv file as dicts, skipping the first ``start``. """
+
+    with open(path, newline="") as in_file:
+        yield from islice(csv.DictReader(in_file), start, None)
+
+
+def bigquery_source(
+    query: str, start: int = 0, page_size: int = 10000
+) -> Iterator[dict]:
+    """
+    Rows of a BigQuery query as dicts, fetched one page at a time.
+
+    Offsets are only stable when the query orders its rows, so resuming from
+    a ``start`` needs an ORDER BY on a unique key.
+    """
+    if start and not re.search(r"\border\s+by\b", query, re.IGNORECASE):
+        raise ValueError("Resuming a BigQuery import needs a query with ORDER BY")
+
+    from google.cloud import bigquery
+
+    client = bigquery.Client()
+    result = client.query(query).result(page_size=page_size, start_index=start)
+    for row in result:
+        yield dict(row.items())
+
+
+def _progress(session, job: str) -> Optional[Tuple[int, bool]]:
+    """ Rows committed and whether it finished, for the last run of ``job``. """
+    from sqlalchemy import select
+
+    from .etl_state import IMPORT_PROGRESS
+
+    row = session.execute(
+        select(IMPORT_PROGRESS.c.rows_committed, IMPORT_PROGRESS.c.finished).where(
+            IMPORT_PROGRESS.c.job == job
+        )
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def _set_progress(session, job: str, rows: int, finished: bool = False) -> None:
+    from .etl_state import IMPORT_PROGRESS
+
+    session.execute(IMPORT_PROGRESS.delete().where(IMPORT_PROGRESS.c.job == job))
+    session.execute(
+        IMPORT_PROGRESS.insert().values(job=job, rows_committed=rows, finished=finished)
+    )
+
+
+def _copy_batch(session, table: str, columns: List[str], batch: List[dict]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow(["\\N" if row[col] is None else row[col] for col in columns])
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        buffer,
+    )
+
+
+def _insert_batch(session, table: str, columns: List[str], batch: List[dict]) -> None:
+    from sqlalchemy import text
+
+    insert = text(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        + f"VALUES ({', '.join(':' + col for col in columns)})"
+    )
+    session.execute(insert, batch)
+
+
+def stream_import(
+    session,
+    job: str,
+    source: Callable[[int], Iterable[dict]],
+    convert: Callable[[dict], Optional[dict]],
+    table: str,
+    columns: List[str],
+    batch_size: int = 10000,
+    resume: bool = False,
+    replace: Callable = None,
+) -> int:
+    """
+    Load ``source`` into ``table`` one batch at a time, committing each batch.
+
+    ``source(start)`` yields source rows from offset ``start``, always in the
+    same order, or resuming would skip and repeat rows. ``convert`` maps a
+    source row to a dict of ``columns``, or None to drop it. Batches are
+    written with COPY on PostgreSQL and executemany elsewhere. The count of
+    source rows consumed is committed in the same transaction as each batch,
+    so ``resume=True`` continues an unfinished run after its last batch.
+
+    Starting from the beginning calls ``replace(session)`` first, inside the
+    transaction of the first batch, to delete or truncate what earlier runs
+    loaded; readers never see the table empty. Once ``job`` has run, finished
+    or not, starting over without ``replace`` would load its rows twice, so
+    it raises instead. Memory use is bounded by one batch. Returns the rows
+    written this run.
+    """
+
+    progress = _progress(session, job)
+    committed, finished = progress or (0, False)
+    if resume and finished:
+        print(f"{job}: the last import finished; nothing to resume.")
+        return 0
+
+    start = committed if resume else 0
+    if start:
+        print(f"{job}: resuming after {start} rows.")
+    else:
+        if progress is not None and replace is None:
+            session.rollback()
+            if finished:
+                loaded = "an earlier import already loaded its rows"
+            else:
+                loaded = f"an unfinished import already committed {committed} rows"
+            raise RuntimeError(
+                f"{job}: {loaded}; give replace to start over"
+                + ("" if finished else ", or resume it")
+            )
+        if replace is not None:
+            print(f"{job}: replacing the rows of earlier imports.")
+            replace(session)
+        _set_progress(session, job, 0)
+
+    use_copy = session.get_bind().dialect.name == "postgresql"
+    consumed = start
+    written = 0
+    began = time.time()
+
+    for batch in batched(source(start), batch_size):
+        consumed += len(batch)
+        rows = [row for row in map(convert, batch) if row is not None]
+        if rows:
+            (_copy_batch if use_copy else _insert_batch)(session, table, columns, rows)
+        _set_progress(session, job, consumed)
+        session.commit()
+
+        written += len(rows)
+        elapsed = time.time() - began
+        rate = written / max(elapsed, 1e-9)
+        print(f"{job}: {written} rows written, {rate:.0f} rows/s")
+
+    _set_progress(session, job, consumed, finished=True)
+    session.commit()
+    return written
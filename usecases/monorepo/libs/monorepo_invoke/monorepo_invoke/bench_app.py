@@ -0,0 +1,31 @@
+""" A stand-in for an app's create_app, for benchmarking the WSGI server alone. """
+
+import hashlib
+import os
+import time
+
+# Per-request work, to look a bit like a real view: milliseconds spent
+# waiting (as on a database query) and hashing rounds spent on the CPU.
+IO_MS = float(os.environ.get("BENCH_APP_IO_MS", "5"))
+CPU_ROUNDS = int(os.environ.get("BENCH_APP_CPU_ROUNDS", "2000"))
+
+
+def create_app(config_name: str = "bench"):
+    """ A plain WSGI app that answers every request with a small json body. """
+
+    body = f'{{"config": "{config_name}", "ok": true}}'.encode()
+
+    def app(environ, start_response):  # pylint: disable=unused-argument
+        if IO_MS:
+            time.sleep(IO_MS / 1000)
+        digest = b""
+        for _ in range(CPU_ROUNDS):
+            digest = hashlib.sha256(digest).digest()
+
+        start_response(
+            "200 OK",
+            [("Content-Type", "application/json"), ("Content-Length", str(len(body)))],
+        )
+        return [body]
+
+    return app
@@ -0,0 +1,45 @@
+""" Run commands side by side, printing each one's captured output as a block. """
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+# Shared by every concurrent runner, so blocks never interleave.
+_PRINT_LOCK = threading.Lock()
+
+
+class Captured:  # pylint: disable=too-few-public-methods
+    """ How a command with hidden output went. """
+
+    def __init__(self, result, seconds: float):
+        self.result = result
+        self.exited = result.exited
+        self.ok = result.ok
+        self.output = result.stdout + result.stderr
+        self.seconds = seconds
+
+
+def run_captured(ctx, command: str, **kwargs) -> Captured:
+    """ ``ctx.run`` with output hidden and failures returned, not raised. """
+
+    start = time.time()
+    result = ctx.run(command, hide=True, warn=True, **kwargs)
+    return Captured(result, time.time() - start)
+
+
+def print_block(header: str, output: str = "") -> None:
+    """ Print ``header`` and then ``output`` with no other block in between. """
+
+    with _PRINT_LOCK:
+        print(header)
+        if output:
+            print(output, end="" if output.endswith("\n") else "\n")
+
+
+def run_concurrently(function: Callable, items: Iterable, jobs: int = 0) -> List:
+    """ ``function(item)`` per item, ``jobs`` at a time (default all), in order. """
+
+    items = list(items)
+    with ThreadPoolExecutor(max_workers=max(1, jobs or len(items))) as pool:
+        return list(pool.map(function, items))
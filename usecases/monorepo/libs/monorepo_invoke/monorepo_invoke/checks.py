@@ -0,0 +1,78 @@
+""" Run an app's independent checks (tests, linters) at the same time. """
+
+from typing import Callable, Dict, List, Union
+
+from .captured import print_block, run_captured, run_concurrently
+
+# Checks per app: {app name: {check name: command}}. A command may be a
+# function returning the command line, for commands that depend on settings
+# only known once the task runs.
+CHECKS: Dict[str, Dict[str, Union[str, Callable[[], str]]]] = {}
+
+
+def register_check(app: str, name: str, command: Union[str, Callable[[], str]]):
+    """ Add a check to ``app``'s checks, replacing any of the same name. """
+
+    CHECKS.setdefault(app, {})[name] = command
+
+
+class CheckResult:  # pylint: disable=too-few-public-methods
+    """ How one check went. """
+
+    def __init__(self, name: str, exited: int, seconds: float, output: str):
+        self.name = name
+        self.exited = exited
+        self.seconds = seconds
+        self.output = output
+
+    @property
+    def ok(self) -> bool:
+        """ Whether the check passed. """
+        return self.exited == 0
+
+
+def run_checks(ctx, app: str, jobs: int = 0) -> List[CheckResult]:
+    """
+    Run every check registered for ``app``, ``jobs`` at a time (all by default).
+
+    Each check's output is captured and printed as one block when it
+    finishes, so concurrent checks don't interleave. Every check runs even if
+    others fail. Returns the results in registration order.
+    """
+
+    def run_check(item):
+        name, command = item
+        run = run_captured(ctx, command() if callable(command) else command)
+        check = CheckResult(name, run.exited, run.seconds, run.output)
+
+        status = "ok" if check.ok else f"failed ({check.exited})"
+        print_block(f"==== {name}: {status} in {check.seconds:.1f}s ====", check.output)
+        return check
+
+    return run_concurrently(run_check, CHECKS.get(app, {}).items(), jobs)
+
+
+def checks_exit_code(results: List[CheckResult]) -> int:
+    """ The first failing check's exit code, or 0 when all passed. """
+
+    return next((result.exited for result in results if not result.ok), 0)
+
+
+def format_checks(results: List[CheckResult], elapsed: float) -> str:
+    """ A table of status and seconds per check, with the time saved by overlap. """
+
+    if not results:
+        return "No checks registered."
+
+    width = max(len(result.name) for result in results) + 2
+    lines = [
+        result.name.ljust(width)
+        + ("ok" if result.ok else "failed").ljust(8)
+        + f"{result.seconds:.1f}s"
+        for result in results
+    ]
+    serial = sum(result.seconds for result in results)
+    lines.append(
+        f"Finished in {elapsed:.1f}s, against {serial:.1f}s one check after another."
+    )
+    return "\n".join(lines)
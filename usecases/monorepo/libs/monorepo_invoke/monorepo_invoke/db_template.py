@@ -0,0 +1,192 @@
+""" Reset a database by cloning a template built from the current models. """
+
+import glob
+import hashlib
+import os
+import shutil
+import time
+from typing import Callable, List
+
+TEMPLATE_INFIX = "_tpl_"
+SHARD_INFIX = "_shard_"
+
+
+def metadata_fingerprint(engine, metadata) -> str:
+    """
+    A digest of the DDL ``metadata.create_all`` emits on ``engine``'s dialect.
+
+    That is every table, index, sequence and enum type, and any DDL hooked to
+    the metadata's create events, so a change to any of them is a new schema.
+    """
+    from sqlalchemy import create_mock_engine
+
+    digest = hashlib.sha256()
+
+    def record(statement, *multiparams, **params):  # pylint: disable=unused-argument
+        digest.update(str(statement.compile(dialect=recorder.dialect)).encode())
+        digest.update(b"\0")
+
+    recorder = create_mock_engine(engine.url, record)
+    metadata.create_all(recorder, checkfirst=False)
+    return digest.hexdigest()[:16]
+
+
+def _admin_engine(engine):
+    from sqlalchemy import create_engine
+
+    return create_engine(
+        engine.url.set(database="postgres"), isolation_level="AUTOCOMMIT"
+    )
+
+
+def _run(connection, statement, **params):
+    from sqlalchemy import text
+
+    return connection.execute(text(statement), params)
+
+
+def _disconnect(connection, name):
+    """ End every other session connected to database ``name``. """
+
+    _run(
+        connection,
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+        + "WHERE datname = :name AND pid <> pg_backend_pid()",
+        name=name,
+    )
+
+
+def _reset_postgres(engine, fingerprint: str, build: Callable) -> bool:
+    database = engine.url.database
+    template = f"{database}{TEMPLATE_INFIX}{fingerprint}"
+    admin = _admin_engine(engine)
+
+    try:
+        with admin.connect() as connection:
+            exists = _run(
+                connection,
+                "SELECT 1 FROM pg_database WHERE datname = :name",
+                name=template,
+            ).scalar()
+
+            if not exists:
+                build()
+                engine.dispose()
+                _disconnect(connection, database)
+                _run(connection, f'CREATE DATABASE "{template}" TEMPLATE "{database}"')
+
+                # Templates for older models are never used again.
+                stale = _run(
+                    connection,
+                    "SELECT datname FROM pg_database "
+                    + "WHERE datname LIKE :pattern AND datname <> :name",
+                    pattern=f"{database}{TEMPLATE_INFIX}%",
+                    name=template,
+                ).scalars()
+                for name in list(stale):
+                    _run(connection, f'DROP DATABASE IF EXISTS "{name}"')
+                return False
+
+            engine.dispose()
+            _disconnect(connection, database)
+            _run(connection, f'DROP DATABASE IF EXISTS "{database}"')
+            _run(connection, f'CREATE DATABASE "{database}" TEMPLATE "{template}"')
+            return True
+    finally:
+        admin.dispose()
+
+
+def _reset_sqlite(engine, fingerprint: str, build: Callable) -> bool:
+    database = engine.url.database
+    if not database or database == ":memory:":
+        raise ValueError("Template resets need a file backed SQLite database")
+
+    template = f"{database}{TEMPLATE_INFIX}{fingerprint}"
+    engine.dispose()
+
+    if not os.path.exists(template):
+        build()
+        engine.dispose()
+        for stale in glob.glob(f"{glob.escape(database)}{TEMPLATE_INFIX}*"):
+            os.remove(stale)
+        shutil.copyfile(database, f"{template}.tmp")
+        os.replace(f"{template}.tmp", template)
+        return False
+
+    shutil.copyfile(template, f"{database}.tmp")
+    os.replace(f"{database}.tmp", database)
+    return True
+
+
+def reset_from_template(engine, metadata, build: Callable) -> bool:
+    """
+    Reset ``engine``'s database to the empty schema that ``build()`` creates.
+
+    The first reset for a given ``metadata`` fingerprint runs ``build()`` and
+    saves the result as a template: a ``CREATE DATABASE ... TEMPLATE`` copy on
+    PostgreSQL, a file copy on SQLite. Later resets clone the template instead
+    of rebuilding, until the models change. Connections to the database are
+    closed while it is replaced. Returns True when the template was reused.
+    """
+
+    start = time.time()
+    fingerprint = metadata_fingerprint(engine, metadata)
+
+    if engine.dialect.name == "postgresql":
+        cloned = _reset_postgres(engine, fingerprint, build)
+    elif engine.dialect.name == "sqlite":
+        cloned = _reset_sqlite(engine, fingerprint, build)
+    else:
+        raise ValueError(f"No template reset for {engine.dialect.name} databases")
+
+    action = "Cloned template" if cloned else "Built and saved template"
+    print(f"{action} {fingerprint} in {time.time() - start:.2f}s.")
+    return cloned
+
+
+def _clone_postgres(engine, fingerprint: str, names: List[str]) -> None:
+    template = f"{engine.url.database}{TEMPLATE_INFIX}{fingerprint}"
+    admin = _admin_engine(engine)
+    try:
+        with admin.connect() as connection:
+            # One at a time: PostgreSQL won't copy a template that is in use.
+            for name in names:
+                _disconnect(connection, name)
+                _run(connection, f'DROP DATABASE IF EXISTS "{name}"')
+                _run(connection, f'CREATE DATABASE "{name}" TEMPLATE "{template}"')
+    finally:
+        admin.dispose()
+
+
+def _clone_sqlite(engine, fingerprint: str, names: List[str]) -> None:
+    template = f"{engine.url.database}{TEMPLATE_INFIX}{fingerprint}"
+    for name in names:
+        shutil.copyfile(template, f"{name}.tmp")
+        os.replace(f"{name}.tmp", name)
+
+
+def clone_databases(engine, metadata, build: Callable, count: int) -> List[str]:
+    """
+    ``count`` fresh databases with the schema ``build()`` creates, as urls.
+
+    They are cloned from the template `reset_from_template` keeps (which also
+    resets ``engine``'s own database, building the template first when the
+    models changed), named after that database with a ``_shard_<n>`` suffix,
+    and replaced on every call: one each for concurrent test shards.
+    """
+
+    reset_from_template(engine, metadata, build)
+    fingerprint = metadata_fingerprint(engine, metadata)
+    names = [f"{engine.url.database}{SHARD_INFIX}{index}" for index in range(count)]
+
+    start = time.time()
+    if engine.dialect.name == "postgresql":
+        _clone_postgres(engine, fingerprint, names)
+    else:
+        _clone_sqlite(engine, fingerprint, names)
+    print(f"Cloned {count} shard databases in {time.time() - start:.2f}s.")
+
+    return [
+        engine.url.set(database=name).render_as_string(hide_password=False)
+        for name in names
+    ]
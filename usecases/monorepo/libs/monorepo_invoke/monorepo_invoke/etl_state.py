@@ -0,0 +1,39 @@
+""" Tables the ETL helpers keep their state in, for the app's migrations to create.
+
+The helpers never create these tables themselves. Add them to the app's
+models, so `flask db migrate` picks them up like any other table:
+
+    from monorepo_invoke import add_etl_tables
+
+    add_etl_tables(db.metadata)
+"""
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table
+
+METADATA = MetaData()
+
+# The last successful start of each incremental job, and the ruleset it ran.
+WATERMARKS = Table(
+    "etl_watermarks",
+    METADATA,
+    Column("job", String(200), primary_key=True),
+    Column("watermark", DateTime(timezone=True), nullable=False),
+    Column("ruleset_digest", String(64), nullable=False),
+)
+
+# How far each streaming import got, and whether it ran to the end.
+IMPORT_PROGRESS = Table(
+    "etl_import_progress",
+    METADATA,
+    Column("job", String(200), primary_key=True),
+    Column("rows_committed", Integer, nullable=False),
+    Column("finished", Boolean, nullable=False),
+)
+
+
+def add_etl_tables(metadata: MetaData) -> None:
+    """ Define the ETL state tables on ``metadata`` too, unless already there. """
+
+    for table in METADATA.tables.values():
+        if table.name not in metadata.tables:
+            table.to_metadata(metadata)
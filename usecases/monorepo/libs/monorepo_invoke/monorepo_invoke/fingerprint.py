@@ -0,0 +1,205 @@
+""" Fingerprint the inputs of a build so unchanged builds can be skipped. """
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .jsonfile import atomic_write_json
+
+# Directories that never contribute to a build's inputs.
+SKIP_DIRS = {
+    ".git",
+    "node_modules",
+    "dist",
+    "__pycache__",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".build_cache",
+    ".checkpoints",
+}
+
+
+def hash_file(path: str) -> str:
+    """ sha256 of a file's contents. """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_files(paths: Iterable[str]) -> Iterable[str]:
+    """ Yield every file under ``paths``, which may be files or directories. """
+
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in sorted(files):
+                if not name.endswith((".pyc", ".log")):
+                    yield os.path.join(root, name)
+
+
+def _ignore_regex(pattern: str) -> str:
+    parts = []
+    for token in re.split(r"(\*\*/?|\*|\?)", pattern.strip("/")):
+        if token.startswith("**"):
+            parts.append("(?:.*/)?" if token.endswith("/") else ".*")
+        elif token == "*":
+            parts.append("[^/]*")
+        elif token == "?":
+            parts.append("[^/]")
+        else:
+            parts.append(re.escape(token))
+    # A pattern naming a directory excludes everything below it too.
+    return "".join(parts) + "(?:/.*)?"
+
+
+def dockerignore(root: str) -> Callable[[str], bool]:
+    """
+    Whether a path relative to ``root`` is excluded by ``root``/.dockerignore.
+
+    Follows docker's rules: patterns are relative to the context root, ``**``
+    spans directories, ``!`` re-includes, and the last matching line wins.
+    """
+
+    rules = []
+    try:
+        with open(os.path.join(root, ".dockerignore")) as in_file:
+            for line in in_file:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                include = line.startswith("!")
+                pattern = os.path.normpath(line.lstrip("!").strip())
+                rules.append((re.compile(_ignore_regex(pattern)), include))
+    except OSError:
+        pass
+
+    def excluded(path: str) -> bool:
+        result = False
+        for regex, include in rules:
+            if regex.fullmatch(path):
+                result = not include
+        return result
+
+    return excluded
+
+
+def context_files(root: str) -> List[str]:
+    """
+    The files of a docker build context at ``root`` that can affect the image.
+
+    That is the files git tracks there, as they are on disk, less what
+    .dockerignore excludes: generated and untracked files (caches, secrets,
+    rendered deploy files) never force a rebuild. Outside a git checkout every
+    file not in SKIP_DIRS counts.
+    """
+
+    listing = subprocess.run(
+        ["git", "ls-files", "-z", "--cached"],
+        cwd=root,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=False,
+    )
+    if listing.returncode == 0:
+        relative = [name for name in listing.stdout.decode().split("\0") if name]
+    else:
+        relative = [os.path.relpath(path, root) for path in iter_files([root])]
+
+    excluded = dockerignore(root)
+    return [
+        os.path.join(root, name)
+        for name in sorted(relative)
+        if not excluded(name) and os.path.isfile(os.path.join(root, name))
+    ]
+
+
+class Fingerprint:
+    """
+    A digest over a set of input files and arguments, stored as json.
+
+    Files whose size and mtime match the stored record are not re-hashed,
+    so checking an unchanged tree only costs a ``stat`` per file.
+    """
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        self.previous = self.load()
+        self.files: Dict[str, dict] = {}
+        self.args: Dict[str, str] = {}
+        self.digest = ""
+
+    def load(self) -> dict:
+        """ Read the previously saved record, if any. """
+
+        try:
+            with open(self.state_path) as in_file:
+                return json.load(in_file)
+        except (OSError, ValueError):
+            return {}
+
+    def compute(self, paths: Iterable[str], args: Dict[str, str]) -> str:
+        """ Hash ``paths`` and ``args`` into a single digest. """
+
+        old_files = self.previous.get("files", {})
+        digest = hashlib.sha256()
+
+        for path in iter_files(paths):
+            stat = os.stat(path)
+            old = old_files.get(path)
+            if old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+                sha = old["sha"]
+            else:
+                sha = hash_file(path)
+            self.files[path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha": sha}
+            digest.update(f"{path}\0{sha}\0".encode())
+
+        self.args = {key: str(val) for key, val in sorted(args.items())}
+        digest.update(json.dumps(self.args).encode())
+
+        self.digest = digest.hexdigest()
+        return self.digest
+
+    def changes(self) -> List[str]:
+        """ Human readable reasons why this fingerprint differs from the last one. """
+
+        if not self.previous:
+            return ["no previous build recorded"]
+
+        reasons = []
+        for key, val in self.args.items():
+            old = self.previous.get("args", {}).get(key)
+            if old != val:
+                reasons.append(f"argument {key} changed: {old} -> {val}")
+
+        old_files = self.previous.get("files", {})
+        for path, record in self.files.items():
+            if path not in old_files:
+                reasons.append(f"added: {path}")
+            elif old_files[path]["sha"] != record["sha"]:
+                reasons.append(f"modified: {path}")
+        for path in old_files:
+            if path not in self.files:
+                reasons.append(f"removed: {path}")
+
+        return reasons
+
+    def is_fresh(self) -> bool:
+        """ True when the computed digest matches the saved one. """
+        return bool(self.digest) and self.digest == self.previous.get("digest")
+
+    def save(self, extra: Optional[dict] = None) -> None:
+        """ Record the computed fingerprint, replacing the file atomically. """
+
+        record = {"digest": self.digest, "args": self.args, "files": self.files}
+        record.update(extra or {})
+        atomic_write_json(self.state_path, record, indent=2, sort_keys=True)
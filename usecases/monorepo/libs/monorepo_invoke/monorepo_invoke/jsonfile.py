@@ -0,0 +1,28 @@
+""" Json state files that are never seen half written. """
+
+import json
+import os
+import threading
+
+
+def atomic_write_json(path: str, data, **dump_kwargs) -> None:
+    """
+    Write ``data`` as json to ``path``, replacing the file atomically.
+
+    Readers, and a rerun after a crash, see either the old file or the new
+    one, never a partial write. The temporary file is removed if writing
+    fails. ``dump_kwargs`` are passed on to `json.dump`.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as out_file:
+            json.dump(data, out_file, **dump_kwargs)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,145 @@
+""" Replay cached lint results, re-linting only changed files and their importers. """
+
+import ast
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Set
+
+from .fingerprint import hash_file, iter_files
+from .jsonfile import atomic_write_json
+
+
+def module_name(path: str, root: str) -> str:
+    """ The dotted module for ``path``, with the package ``root`` as its top level. """
+
+    relative = os.path.relpath(path, os.path.dirname(os.path.abspath(root)))
+    parts = relative[: -len(".py")].split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+
+def imported_modules(path: str, module: str) -> Set[str]:
+    """ Every module ``path`` imports, and for ``from x import y`` also x.y. """
+
+    try:
+        with open(path, "rb") as in_file:
+            tree = ast.parse(in_file.read(), path)
+    except (SyntaxError, ValueError):
+        return set()
+
+    is_package = os.path.basename(path) == "__init__.py"
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                package = module.split(".")
+                package = package[: len(package) - node.level + is_package]
+                base = ".".join(package + ([base] if base else []))
+            found.add(base)
+            found.update(f"{base}.{alias.name}" for alias in node.names)
+    return found
+
+
+def with_importers(changed: Set[str], files: List[str], root: str) -> Set[str]:
+    """ ``changed`` plus every file that imports one of them, directly or not. """
+
+    modules = {module_name(path, root): path for path in files}
+    importers: Dict[str, Set[str]] = {}
+    for path in files:
+        for name in imported_modules(path, module_name(path, root)):
+            if name in modules:
+                importers.setdefault(modules[name], set()).add(path)
+
+    result = set(changed)
+    todo = list(changed)
+    while todo:
+        for importer in importers.get(todo.pop(), ()):
+            if importer not in result:
+                result.add(importer)
+                todo.append(importer)
+    return result
+
+
+def attribute(output: str, files: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    Output lines grouped by the file they start with (``path:line: ...``).
+
+    Paths are compared normalized and relative to the cwd, so a tool printing
+    ``apps/x.py`` or ``/abs/apps/x.py`` for ``./apps/x.py`` still matches.
+    """
+
+    by_file: Dict[str, List[str]] = {path: [] for path in files}
+    normalized = {os.path.relpath(path): path for path in by_file}
+    for line in output.splitlines():
+        path = line.split(":", 1)[0].strip()
+        if not path:
+            continue
+        path = normalized.get(os.path.relpath(path))
+        if path is not None:
+            by_file[path].append(line)
+    return by_file
+
+
+def cached_lint(
+    ctx,
+    command: str,
+    root: str,
+    config_files: List[str],
+    cache_path: str,
+) -> int:
+    """
+    Lint the Python files under ``root`` that need it, replaying the rest.
+
+    The cache is keyed by ``command``, the output of its ``--version`` and
+    the contents of ``config_files``; a change to any re-lints everything.
+    Otherwise a file is re-linted when its content hash changed, or when it
+    imports, directly or not, a file that changed. ``command`` must print
+    diagnostics as ``path:line: ...``, and only ones it can tell from the
+    files it was given and what they import: checks across unrelated files
+    (pylint's duplicate-code) can't be replayed per file. Returns 1 when there
+    are diagnostics, the tool's own exit code if it failed without any, else 0.
+    """
+
+    version = ctx.run(f"{command.split()[0]} --version", hide=True).stdout
+    key = hashlib.sha256(f"{command}\0{version}".encode())
+    for path in config_files:
+        if os.path.exists(path):
+            key.update(hash_file(path).encode())
+
+    try:
+        with open(cache_path) as in_file:
+            cache = json.load(in_file)
+    except (OSError, ValueError):
+        cache = {}
+    entries = cache.get("files", {}) if cache.get("key") == key.hexdigest() else {}
+
+    files = [path for path in iter_files([root]) if path.endswith(".py")]
+    hashes = {path: hash_file(path) for path in files}
+    changed = {
+        path for path in files if entries.get(path, {}).get("hash") != hashes[path]
+    }
+    relint = sorted(with_importers(changed, files, root)) if changed else []
+    print(f"Linting {len(relint)} of {len(files)} files; the rest are cached.")
+
+    if relint:
+        result = ctx.run(f"{command} {' '.join(relint)}", hide=True, warn=True)
+        diagnostics = attribute(result.stdout + result.stderr, relint)
+        if not result.ok and not any(diagnostics.values()):
+            # The tool failed on its own (bad config, crash): nothing to cache.
+            print(result.stdout + result.stderr, end="")
+            return result.exited or 1
+        for path in relint:
+            entries[path] = {"hash": hashes[path], "diagnostics": diagnostics[path]}
+
+    entries = {path: entries[path] for path in files}
+    atomic_write_json(cache_path, {"key": key.hexdigest(), "files": entries})
+
+    lines = [line for path in files for line in entries[path]["diagnostics"]]
+    for line in lines:
+        print(line)
+    return 1 if lines else 0
@@ -0,0 +1,86 @@
+""" Start a local Postgres container only when needed, and wait until it answers. """
+
+import socket
+import struct
+import time
+
+from .sql_proxy import wait_for_port
+
+# An SSLRequest packet: length 8, then the magic request code 80877103.
+SSL_REQUEST = struct.pack("!ii", 8, 80877103)
+
+
+def postgres_answers(sock: socket.socket) -> bool:
+    """
+    Whether a Postgres server is speaking the protocol on ``sock``.
+
+    Sends an SSLRequest, which a server answers with a single "S" or "N"
+    before any authentication. A port that is open but not yet served by
+    Postgres (a starting container's proxy, say) gives no such answer.
+    """
+
+    try:
+        sock.sendall(SSL_REQUEST)
+        return sock.recv(1) in (b"S", b"N")
+    except OSError:
+        return False
+
+
+def postgres_ready(host: str = "127.0.0.1", port: int = 5432, timeout=1.0) -> bool:
+    """ Whether Postgres answers on ``host:port`` right now. """
+
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            return postgres_answers(sock)
+    except OSError:
+        return False
+
+
+def compose_running(ctx, compose_file: str) -> bool:
+    """ Whether every container of ``compose_file`` exists and is running. """
+
+    compose = f"docker-compose -f {compose_file}"
+    containers = ctx.run(f"{compose} ps -q", hide=True, warn=True).stdout.split()
+    if not containers:
+        return False
+    states = ctx.run(
+        f"docker inspect -f '{{{{.State.Running}}}}' {' '.join(containers)}",
+        hide=True,
+        warn=True,
+    )
+    return states.ok and set(states.stdout.split()) == {"true"}
+
+
+def ensure_local_pg(
+    ctx,
+    compose_file: str,
+    host: str = "127.0.0.1",
+    port: int = 5432,
+    timeout: float = 60.0,
+) -> bool:
+    """
+    Make sure the Postgres from ``compose_file`` is up and answering.
+
+    If its containers are already running, only waits until Postgres answers.
+    Otherwise runs ``docker-compose up -d`` and polls with exponential backoff
+    until it does. A Postgres from anywhere else answering on ``host:port``
+    doesn't count: that raises RuntimeError rather than pointing the tests at
+    the wrong database. Raises TimeoutError after ``timeout`` seconds. Returns
+    True when the container was started.
+    """
+
+    start = time.monotonic()
+    started = not compose_running(ctx, compose_file)
+    if started:
+        if postgres_ready(host, port):
+            raise RuntimeError(
+                f"Another Postgres is answering on {host}:{port}; stop it, or "
+                + f"start the one from {compose_file} on another port"
+            )
+        ctx.run(f"docker-compose -f {compose_file} up -d", pty=True, echo=True)
+
+    remaining = timeout - (time.monotonic() - start)
+    wait_for_port(host, port, remaining, probe=postgres_answers)
+    if started:
+        print(f"Postgres ready on {host}:{port} after {time.monotonic() - start:.2f}s.")
+    return started
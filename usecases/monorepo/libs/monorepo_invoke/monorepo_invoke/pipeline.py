@@ -0,0 +1,86 @@
+""" Run a sequence of stages for several apps, overlapping stages across apps. """
+
+import threading
+from typing import Dict, List, Tuple
+
+from .affected import app_task_command
+from .captured import print_block, run_captured, run_concurrently
+
+# (stage name, task arguments); placeholders are filled from run_pipeline params.
+DEPLOY_STAGES = [
+    ("build", "docker-build --project {project} --env prod"),
+    ("push", "docker-push --project {project}"),
+    ("deploy", "deploy --project {project} --no-build{deploy_flags}"),
+]
+
+
+class StageResult:  # pylint: disable=too-few-public-methods
+    """ How one stage went for one app. """
+
+    def __init__(self, status: str = "skipped", seconds: float = 0.0, output: str = ""):
+        self.status = status
+        self.seconds = seconds
+        self.output = output
+
+
+def run_pipeline(
+    ctx,
+    apps: List[str],
+    stages: List[Tuple[str, str]],
+    limits: Dict[str, int],
+    params: Dict[str, str],
+) -> Dict[str, Dict[str, StageResult]]:
+    """
+    Run every stage in order for each app, with apps moving independently.
+
+    At most ``limits[stage]`` apps run a given stage at the same time, so one
+    app can build while another pushes. A failed stage stops that app's later
+    stages but not other apps. Returns results keyed by app, then by stage.
+    """
+
+    semaphores = {
+        name: threading.Semaphore(max(1, limits.get(name, 1))) for name, _ in stages
+    }
+    results = {app: {name: StageResult() for name, _ in stages} for app in apps}
+
+    def run_app(app):
+        for name, task_args in stages:
+            with semaphores[name]:
+                command = app_task_command(app, task_args.format(**params))
+                run = run_captured(ctx, command)
+
+            status = "ok" if run.ok else "failed"
+            results[app][name] = StageResult(status, run.seconds, run.output)
+            print_block(
+                f"{app}: {name} {status} in {run.seconds:.1f}s",
+                "" if run.ok else run.output,
+            )
+
+            if not run.ok:
+                return
+
+    run_concurrently(run_app, apps)
+    return results
+
+
+def format_results(results: Dict[str, Dict[str, StageResult]]) -> str:
+    """ A table of status and seconds per app and stage, plus each app's total. """
+
+    if not results:
+        return ""
+
+    stages = list(next(iter(results.values())))
+    width = max(len(app) for app in results) + 2
+    lines = [
+        "app".ljust(width) + "".join(stage.ljust(16) for stage in stages) + "total"
+    ]
+
+    for app, app_results in results.items():
+        cells = [
+            f"{result.status} {result.seconds:.1f}s".ljust(16)
+            for result in app_results.values()
+        ]
+        total = sum(result.seconds for result in app_results.values())
+        lines.append(app.ljust(width) + "".join(cells) + f"{total:.1f}s")
+
+    return "\n".join(lines)
@@ -0,0 +1,172 @@
+""" Split a pytest suite across processes, balanced by earlier per-file run times. """
+
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List
+
+from .captured import print_block, run_captured, run_concurrently
+from .fingerprint import SKIP_DIRS
+from .jsonfile import atomic_write_json
+
+
+def find_test_files(root: str) -> List[str]:
+    """ pytest's default test files (test_*.py, *_test.py) under ``root``, sorted. """
+
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in SKIP_DIRS]
+        found.extend(
+            os.path.join(dirpath, name)
+            for name in filenames
+            if name.endswith(".py")
+            and (name.startswith("test_") or name.endswith("_test.py"))
+        )
+    return sorted(found)
+
+
+def load_durations(path: str) -> Dict[str, float]:
+    """ Seconds per test file from earlier runs, or {} without history. """
+
+    try:
+        with open(path) as in_file:
+            return json.load(in_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_durations(path: str, durations: Dict[str, float]) -> None:
+    """ Replace the durations file atomically. """
+
+    atomic_write_json(path, durations, indent=2, sort_keys=True)
+
+
+def balance(
+    files: List[str], durations: Dict[str, float], shards: int
+) -> List[List[str]]:
+    """
+    Split ``files`` into ``shards`` groups of about equal expected run time.
+
+    Files are placed longest first onto the least loaded shard. Files without
+    history count as the average known file; with no history at all every
+    file counts the same, which balances by file count.
+    """
+
+    known = [durations[name] for name in files if name in durations]
+    default = sum(known) / len(known) if known else 1.0
+    weight = {name: durations.get(name, default) for name in files}
+
+    groups: List[List[str]] = [[] for _ in range(shards)]
+    loads = [0.0] * shards
+    for name in sorted(files, key=lambda name: (-weight[name], name)):
+        shard = loads.index(min(loads))
+        groups[shard].append(name)
+        loads[shard] += weight[name]
+    return [sorted(group) for group in groups if group]
+
+
+def file_durations(report: str, root: str) -> Dict[str, float]:
+    """ Seconds per test file in a junit xml ``report``, keyed like find_test_files. """
+
+    durations: Dict[str, float] = {}
+    for case in ET.parse(report).getroot().iter("testcase"):
+        # pytest puts the module path, dotted, in classname: pkg.test_mod.TestClass
+        parts = case.get("classname", "").split(".")
+        for end in range(len(parts), 0, -1):
+            name = os.path.join(root, *parts[:end]) + ".py"
+            if os.path.exists(name):
+                durations[name] = durations.get(name, 0.0) + float(case.get("time", 0))
+                break
+    return durations
+
+
+def merge_reports(reports: List[str], path: str) -> Dict[str, float]:
+    """ Combine junit xml ``reports`` into one at ``path``, returning the totals. """
+
+    merged = ET.Element("testsuites")
+    totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0, "time": 0.0}
+
+    for report in reports:
+        root = ET.parse(report).getroot()
+        for suite in [root] if root.tag == "testsuite" else root.iter("testsuite"):
+            merged.append(suite)
+            for key in totals:
+                totals[key] += type(totals[key])(suite.get(key, 0))
+
+    for key, value in totals.items():
+        merged.set(key, f"{value:.3f}" if key == "time" else str(value))
+    ET.ElementTree(merged).write(path, encoding="utf-8", xml_declaration=True)
+    return totals
+
+
+def run_test_shards(
+    ctx,
+    root: str,
+    shards: int,
+    durations_path: str,
+    report_path: str,
+    pytest_args: str = "",
+    shard_envs: Callable[[int], List[Dict[str, str]]] = None,
+) -> int:
+    """
+    Run the tests under ``root`` as ``shards`` concurrent pytest processes.
+
+    Each process gets ``TEST_SHARD`` (0, 1, ...) and ``TEST_SHARD_COUNT`` in
+    its environment, plus the variables ``shard_envs(shard_count)`` returns
+    for it; that is where each shard is given a database of its own, e.g.
+    from `clone_databases`. Each shard's output is printed as one block when
+    it finishes. The shards' junit reports are merged into ``report_path``,
+    and per-file durations are saved to ``durations_path`` to balance the
+    next run. Returns the first non-zero pytest exit code, or 0.
+    """
+
+    files = find_test_files(root)
+    durations = load_durations(durations_path)
+    groups = balance(files, durations, max(1, shards))
+    print(
+        f"{len(files)} test files in {len(groups)} shards, balanced by "
+        + ("recorded durations." if durations else "file count (no history yet).")
+    )
+
+    envs = [
+        dict(extra, TEST_SHARD=str(shard), TEST_SHARD_COUNT=str(len(groups)))
+        for shard, extra in enumerate(
+            shard_envs(len(groups)) if shard_envs else [{}] * len(groups)
+        )
+    ]
+
+    report_dir = os.path.dirname(report_path) or "."
+    os.makedirs(report_dir, exist_ok=True)
+
+    def run_shard(shard):
+        report = os.path.join(report_dir, f".shard-{shard}.xml")
+        run = run_captured(
+            ctx,
+            f"pytest {pytest_args} --junitxml={report} " + " ".join(groups[shard]),
+            env=envs[shard],
+        )
+        print_block(
+            f"==== shard {shard}: {len(groups[shard])} files, exit "
+            + f"{run.exited} in {run.seconds:.1f}s ====",
+            run.output,
+        )
+        return report, run.exited
+
+    start = time.time()
+    finished = run_concurrently(run_shard, range(len(groups)))
+
+    reports = [report for report, _ in finished if os.path.exists(report)]
+    totals = merge_reports(reports, report_path)
+    for report in reports:
+        durations.update(file_durations(report, root))
+        os.remove(report)
+    save_durations(durations_path, durations)
+
+    print(
+        f"{totals['tests']} tests, {totals['failures']} failures, "
+        + f"{totals['errors']} errors, {totals['skipped']} skipped; "
+        + f"{totals['time']:.1f}s of tests in {time.time() - start:.1f}s. "
+        + f"Report: {report_path}"
+    )
+    return next((code for _, code in finished if code), 0)
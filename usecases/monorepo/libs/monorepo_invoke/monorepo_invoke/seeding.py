@@ -0,0 +1,153 @@
+""" Bulk load csv files into tables, in foreign key order, several tables at a time. """
+
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from .batch_import import batched
+
+
+def reflect_tables(engine, names: List[str]) -> Dict[str, object]:
+    """ ``{name: Table}`` for each ``name`` (or ``schema.name``), read from the db. """
+    from sqlalchemy import MetaData, Table
+
+    metadata = MetaData()
+    tables = {}
+    for name in names:
+        schema, _, table_name = name.rpartition(".")
+        tables[name] = Table(
+            table_name, metadata, schema=schema or None, autoload_with=engine
+        )
+    return tables
+
+
+def _as_tables(engine, tables) -> List:
+    names = [table for table in tables if isinstance(table, str)]
+    reflected = reflect_tables(engine, names) if names else {}
+    return [reflected.get(table, table) for table in tables]
+
+
+def load_levels(engine, tables: List) -> List[List]:
+    """
+    Group ``tables`` into levels that can each be loaded concurrently.
+
+    ``tables`` are SQLAlchemy Tables, or names to reflect from the database.
+    Every table comes after the tables it references; references to tables
+    that aren't being loaded are ignored. Levels hold the Tables, in name
+    order. Raises ValueError on a cycle.
+    """
+
+    by_name = {table.fullname: table for table in _as_tables(engine, tables)}
+    deps = {
+        name: {
+            key.column.table.fullname
+            for key in table.foreign_keys
+            if key.column.table.fullname in by_name
+            and key.column.table.fullname != name
+        }
+        for name, table in by_name.items()
+    }
+
+    levels = []
+    while deps:
+        ready = sorted(name for name, needs in deps.items() if not needs)
+        if not ready:
+            raise ValueError(f"Foreign key cycle between {', '.join(sorted(deps))}")
+        levels.append([by_name[name] for name in ready])
+        deps = {
+            name: needs - set(ready)
+            for name, needs in deps.items()
+            if name not in ready
+        }
+    return levels
+
+
+def _csv_columns(table, columns: List[str]) -> List[str]:
+    unknown = [column for column in columns if column not in table.c]
+    if unknown:
+        raise ValueError(f"{table.fullname} has no columns {', '.join(unknown)}")
+    return columns
+
+
+def _copy_csv(connection, table, path: str) -> int:
+    # Quote like SQLAlchemy does, so mixed-case names aren't folded to lower case.
+    preparer = connection.dialect.identifier_preparer
+    with open(path, newline="") as in_file:
+        columns = _csv_columns(table, next(csv.reader(in_file)))
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f"COPY {preparer.format_table(table)} "
+            + f"({', '.join(preparer.quote(column) for column in columns)}) "
+            + "FROM STDIN WITH (FORMAT csv)",
+            in_file,
+        )
+        return cursor.rowcount
+
+
+def _insert_csv(connection, table, path: str, batch_size: int) -> int:
+    rows = 0
+    with open(path, newline="") as in_file:
+        reader = csv.reader(in_file)
+        columns = _csv_columns(table, next(reader))
+        for batch in batched(reader, batch_size):
+            # Empty fields are NULL, as they are for COPY ... (FORMAT csv).
+            connection.execute(
+                table.insert(),
+                [
+                    {column: value or None for column, value in zip(columns, row)}
+                    for row in batch
+                ],
+            )
+            rows += len(batch)
+    return rows
+
+
+def load_csv(engine, table, path: str, batch_size: int = 10000) -> int:
+    """
+    Load one csv file, whose header names the columns, in a single transaction.
+
+    ``table`` is a SQLAlchemy Table, or a name to reflect from the database.
+    PostgreSQL reads the file with COPY; other databases get batched
+    executemany inserts. Returns the number of rows loaded.
+    """
+
+    (table,) = _as_tables(engine, [table])
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            return _copy_csv(connection, table, path)
+        return _insert_csv(connection, table, path, batch_size)
+
+
+def seed_tables(engine, files: Dict, jobs: int = 4, batch_size: int = 10000) -> int:
+    """
+    Load each ``{table: csv path}`` in ``files``, ``jobs`` tables at a time.
+
+    Tables are SQLAlchemy Tables (e.g. from the app's ``db.metadata``), or
+    names to reflect from the database. They are loaded level by level (see
+    `load_levels`), so a table is only loaded once everything it references
+    is in place. Returns the total rows.
+    """
+
+    start = time.time()
+    total = 0
+    tables = _as_tables(engine, list(files))
+    paths = {table.fullname: path for table, path in zip(tables, files.values())}
+
+    def timed_load(table):
+        table_start = time.time()
+        rows = load_csv(engine, table, paths[table.fullname], batch_size)
+        return table, rows, time.time() - table_start
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for level in load_levels(engine, tables):
+            for table, rows, seconds in pool.map(timed_load, level):
+                total += rows
+                print(
+                    f"{table.fullname}: {rows} rows in {seconds:.2f}s "
+                    + f"({rows / max(seconds, 1e-9):.0f} rows/s)"
+                )
+
+    elapsed = time.time() - start
+    print(f"Seeded {len(files)} tables, {total} rows in {elapsed:.2f}s.")
+    return total
@@ -0,0 +1,117 @@
+""" Run a job as independent shards on a process pool, checkpointing finished shards. """
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict
+
+from .jsonfile import atomic_write_json
+
+
+class Checkpoint:
+    """
+    The shards of one job that have finished, stored as json.
+
+    The record is tied to a ``key`` describing the job (its name, arguments
+    and shard count); a record for a different key is ignored. So is one from
+    a run that started more than ``max_age`` seconds ago (0: no limit), since
+    its shards were computed from data that may since have changed.
+    """
+
+    def __init__(self, path: str, key: str, max_age: float = 0):
+        self.path = path
+        self.key = key
+        self.done: Dict[int, int] = {}
+        self.started = time.time()
+
+        try:
+            with open(path) as in_file:
+                record = json.load(in_file)
+            age = self.started - record["started"]
+            if record["key"] == key and max_age and age > max_age:
+                print(f"Ignoring a checkpoint from {age / 3600:.1f} hours ago.")
+            elif record["key"] == key:
+                self.done = {int(shard): rows for shard, rows in record["done"].items()}
+                self.started = record["started"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def mark_done(self, shard: int, rows: int) -> None:
+        """ Record a finished shard, replacing the file atomically. """
+
+        self.done[shard] = rows
+        atomic_write_json(
+            self.path, {"key": self.key, "started": self.started, "done": self.done}
+        )
+
+    def clear(self) -> None:
+        """ Forget every finished shard. """
+
+        self.done = {}
+        self.started = time.time()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _timed(worker: Callable, shard: int, shard_count: int):
+    start = time.time()
+    rows = worker(shard, shard_count)
+    return shard, rows or 0, time.time() - start
+
+
+def run_shards(
+    worker: Callable,
+    shard_count: int,
+    jobs: int,
+    checkpoint: Checkpoint,
+) -> int:
+    """
+    Call ``worker(shard, shard_count)`` for every unfinished shard, ``jobs`` at a time.
+
+    ``worker`` must be picklable and return the number of rows it wrote. Each
+    finished shard is checkpointed, so rerunning after a crash or an interrupt
+    only runs what is left. When every shard has finished the checkpoint is
+    cleared. Returns the total rows across all shards.
+    """
+
+    todo = [shard for shard in range(shard_count) if shard not in checkpoint.done]
+    if len(todo) < shard_count:
+        print(f"Resuming: {shard_count - len(todo)}/{shard_count} shards already done.")
+
+    start = time.time()
+    rows_this_run = 0
+    failure = None
+
+    # fork, so workers start with the task modules already imported.
+    with ProcessPoolExecutor(
+        max_workers=max(1, jobs), mp_context=multiprocessing.get_context("fork")
+    ) as pool:
+        futures = [pool.submit(_timed, worker, shard, shard_count) for shard in todo]
+        for future in as_completed(futures):
+            # Keep checkpointing the shards that do finish, then re-raise.
+            if future.exception() is not None:
+                failure = failure or future.exception()
+                continue
+            shard, rows, seconds = future.result()
+            checkpoint.mark_done(shard, rows)
+            rows_this_run += rows
+            print(
+                f"shard {shard + 1}/{shard_count}: {rows} rows in {seconds:.1f}s "
+                + f"({rows / max(seconds, 1e-9):.0f} rows/s), "
+                + f"{len(checkpoint.done)}/{shard_count} done"
+            )
+
+    if failure is not None:
+        print(f"{len(checkpoint.done)}/{shard_count} shards done; rerun to resume.")
+        raise failure
+
+    elapsed = time.time() - start
+    total = sum(checkpoint.done.values())
+    print(
+        f"All {shard_count} shards done: {total} rows, {rows_this_run} this run "
+        + f"in {elapsed:.1f}s ({rows_this_run / max(elapsed, 1e-9):.0f} rows/s)."
+    )
+    checkpoint.clear()
+    return total
@@ -0,0 +1,248 @@
+""" Run commands with huge output in constant memory, spooling it to disk. """
+
+import gzip
+import os
+import queue
+import threading
+from collections import deque
+from typing import Callable, Iterator, Optional
+
+from invoke.runners import Local
+
+
+class RotatingGzipLog:
+    """
+    Text written to ``path`` (gzip), rotated to path.1 ... path.N when full.
+
+    ``max_bytes`` is measured before compression; the oldest file past
+    ``backups`` is dropped, so disk use is bounded too.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 << 20, backups: int = 4):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, text: str) -> None:
+        """ Append ``text``, rotating first if it would overflow the file. """
+
+        with self.lock:
+            if self.written and self.written + len(text) > self.max_bytes:
+                self.rotate()
+            self.file.write(text)
+            self.written += len(text)
+
+    def rotate(self) -> None:
+        """ Close the current file and shift older ones up by one. """
+
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self.file = gzip.open(self.path, "wt", encoding="utf-8")
+        self.written = 0
+
+    def close(self) -> None:
+        """ Flush and close the current file. """
+
+        with self.lock:
+            self.file.close()
+
+
+class LineSplitter:  # pylint: disable=too-few-public-methods
+    """ Turn arbitrary chunks of text into whole lines for ``on_line``. """
+
+    def __init__(self, on_line: Callable[[str], None]):
+        self.on_line = on_line
+        self.partial = ""
+
+    def feed(self, text: Optional[str]) -> None:
+        """ Pass on every complete line; ``None`` flushes the last partial one. """
+
+        if text is None:
+            if self.partial:
+                self.on_line(self.partial)
+            self.partial = ""
+            return
+
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.on_line(line)
+
+
+class TailStream(str):
+    """
+    The tail of a stream, posing as the whole stream to invoke's watchers.
+
+    Watchers such as `Responder` remember how far into the stream they have
+    read, slice from there and add the slice's length to move on. Here the
+    first ``offset`` characters were dropped: slices shift their indexes by
+    it, and lengths count it, so those positions stay valid as the tail moves.
+    """
+
+    def __new__(cls, tail: str, offset: int):
+        stream = super().__new__(cls, tail)
+        stream.offset = offset
+        return stream
+
+    def __len__(self):
+        return self.offset + super().__len__()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            return super().__getitem__(key)
+        if key.stop is None and (key.start or 0) >= 0:
+            start = key.start or 0
+            return TailStream(
+                super().__getitem__(slice(max(0, start - self.offset), None)),
+                max(0, self.offset - start),
+            )
+        return super().__getitem__(slice(self._shift(key.start), self._shift(key.stop)))
+
+    def _shift(self, index: Optional[int]) -> Optional[int]:
+        if index is None or index < 0:
+            return index
+        return max(0, index - self.offset)
+
+
+class Spooling:
+    """
+    Mixin for a local runner, keeping only the tail of each stream in memory.
+
+    Everything the command prints goes to ``log`` and, line by line, to
+    ``on_line(stream_name, line)``. The result's stdout and stderr hold the
+    last ``tail_bytes`` of each, which is what error messages show. Watchers
+    see the tail as a `TailStream`, so a prompt must fit in ``tail_bytes``.
+    """
+
+    def __init__(
+        self,
+        context,
+        log: RotatingGzipLog,
+        tail_bytes: int = 64 << 10,
+        on_line: Callable[[str, str], None] = None,
+    ):
+        super().__init__(context)
+        self.log = log
+        self.tail_bytes = tail_bytes
+        self.on_line = on_line
+
+    def spool(self, buffer_, hide, output, reader, name):
+        """ Like Runner._handle_output, but with a bounded buffer. """
+
+        tail = deque()
+        size = 0
+        dropped = 0
+        splitter = LineSplitter(lambda line: self.on_line(name, line))
+
+        for data in self.read_proc_output(reader):
+            if not hide:
+                self.write_our_output(stream=output, string=data)
+            self.log.write(data)
+            if self.on_line is not None:
+                splitter.feed(data)
+
+            tail.append(data)
+            size += len(data)
+            while size - len(tail[0]) >= self.tail_bytes:
+                size -= len(tail[0])
+                dropped += len(tail.popleft())
+
+            if self.watchers:
+                stream = TailStream("".join(tail), dropped)
+                for watcher in self.watchers:
+                    for response in watcher.submit(stream):
+                        self.write_proc_stdin(response)
+
+        if self.on_line is not None:
+            splitter.feed(None)
+        buffer_.append("".join(tail)[-self.tail_bytes:])
+
+    def handle_stdout(self, buffer_, hide, output):
+        self.spool(buffer_, hide, output, self.read_proc_stdout, "stdout")
+
+    def handle_stderr(self, buffer_, hide, output):
+        self.spool(buffer_, hide, output, self.read_proc_stderr, "stderr")
+
+
+class SpoolingLocal(Spooling, Local):
+    """ The plain local runner, spooling its output. """
+
+
+def spooling_runner(local: type) -> type:
+    """ ``local`` (a runner class, e.g. `TracingLocal`) with `Spooling` mixed in. """
+
+    if local is Local:
+        return SpoolingLocal
+    return type(f"Spooling{local.__name__}", (Spooling, local), {})
+
+
+def spooled_run(
+    ctx,
+    command: str,
+    log_path: str,
+    tail_kb: int = 64,
+    on_line: Callable[[str, str], None] = None,
+    max_log_mb: int = 64,
+    log_backups: int = 4,
+    **kwargs,
+):
+    """
+    ``ctx.run(command, **kwargs)`` with output spooled to ``log_path``.
+
+    Memory use stays at about ``tail_kb`` per stream however much the command
+    prints. The full output is in ``log_path`` (gzip, rotated every
+    ``max_log_mb`` with ``log_backups`` older files kept); read it with
+    ``zcat``. Returns the invoke Result, whose stdout/stderr are the tails.
+    """
+
+    log = RotatingGzipLog(log_path, max_log_mb << 20, log_backups)
+    # Built on the configured runner, so e.g. --trace still records the command.
+    runner_class = spooling_runner(ctx.config.runners.local)
+    runner = runner_class(ctx, log, tail_kb << 10, on_line)
+    try:
+        # Context._run applies ctx.cd and ctx.prefix, as ctx.run would.
+        return ctx._run(runner, command, **kwargs)  # pylint: disable=protected-access
+    finally:
+        log.close()
+        print(f"Full output in {log_path}")
+
+
+def spooled_lines(ctx, command: str, log_path: str, **kwargs) -> Iterator[tuple]:
+    """
+    Run ``command`` like `spooled_run`, yielding (stream, line) as it prints.
+
+    Lines wait in a bounded queue, so a slow consumer slows the command's
+    output down instead of using memory. The command's failure, if any, is
+    raised once every line has been yielded.
+    """
+
+    lines: queue.Queue = queue.Queue(maxsize=1000)
+    done = object()
+    failure = []
+
+    def run():
+        try:
+            spooled_run(
+                ctx, command, log_path, on_line=lambda *item: lines.put(item), **kwargs
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            failure.append(error)
+        finally:
+            lines.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for item in iter(lines.get, done):
+        yield item
+    thread.join()
+    if failure:
+        raise failure[0]
@@ -0,0 +1,219 @@
+""" A shared, reference counted cloud_sql_proxy that is ready before it is used. """
+
+import atexit
+import signal
+import socket
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple, Union
+
+
+def connect(address: Union[Tuple[str, int], str], timeout: float) -> socket.socket:
+    """ Connect to a ``(host, port)`` TCP address, or to a Unix socket path. """
+
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection(address, timeout=timeout)
+
+
+def describe(address: Union[Tuple[str, int], str]) -> str:
+    """ ``host:port``, or the socket path. """
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+def answers(address: Union[Tuple[str, int], str], timeout: float = 1.0) -> bool:
+    """ Whether something accepts connections on ``address`` right now. """
+
+    try:
+        with connect(address, timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_for_address(
+    address: Union[Tuple[str, int], str],
+    timeout: float = 30.0,
+    initial_delay: float = 0.05,
+    max_delay: float = 1.0,
+    proc: subprocess.Popen = None,
+    probe: Callable[[socket.socket], bool] = None,
+) -> float:
+    """
+    Poll until ``address`` accepts a connection, backing off exponentially.
+
+    ``address`` is a ``(host, port)`` pair or a Unix socket path. With a
+    ``probe``, the address is only ready once ``probe`` returns True for the
+    connected socket. Raises TimeoutError after ``timeout`` seconds, or
+    RuntimeError if ``proc`` exits first, even when something else answers on
+    ``address``. Returns the seconds waited.
+    """
+
+    start = time.monotonic()
+    delay = initial_delay
+
+    while True:
+        ready = False
+        try:
+            with connect(address, max_delay) as sock:
+                ready = probe is None or probe(sock)
+        except OSError:
+            pass
+
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(
+                f"{proc.args[0]} exited with {proc.returncode} "
+                + f"before {describe(address)} was ready"
+            )
+        if ready:
+            return time.monotonic() - start
+
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            raise TimeoutError(f"{describe(address)} not ready after {timeout:.1f}s")
+
+        time.sleep(min(delay, timeout - elapsed))
+        delay = min(delay * 2, max_delay)
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0, **kwargs) -> float:
+    """ `wait_for_address` for a TCP ``host:port``. """
+    return wait_for_address((host, port), timeout, **kwargs)
+
+
+class ProxyManager:
+    """
+    Reference counted proxy processes, one per distinct command line.
+
+    The first `acquire` starts the process and waits for its address; later
+    ones reuse it. The last `release` stops it. Anything still running is
+    stopped at interpreter exit or on SIGTERM.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.procs: Dict[Tuple[str, ...], subprocess.Popen] = {}
+        self.counts: Dict[Tuple[str, ...], int] = {}
+        self.handlers_installed = False
+
+    def acquire(
+        self,
+        command: List[str],
+        address: Union[Tuple[str, int], str],
+        timeout: float = 30.0,
+    ):
+        """
+        Start ``command`` if it is not running yet, and wait for ``address``.
+
+        Raises RuntimeError if something else already answers on ``address``,
+        such as a proxy left over from an earlier run: connections would go to
+        it rather than to ``command``.
+        """
+
+        key = tuple(command)
+        with self.lock:
+            self.install_handlers()
+            proc = self.procs.get(key)
+            if proc is None or proc.poll() is not None:
+                if answers(address):
+                    raise RuntimeError(
+                        f"{describe(address)} is already in use; stop whatever "
+                        + f"is serving it before starting {command[0]}"
+                    )
+                print(f"Starting {command[0]}.")
+                proc = subprocess.Popen(command)
+                self.procs[key] = proc
+                self.counts[key] = 0
+                try:
+                    waited = wait_for_address(address, timeout, proc=proc)
+                except Exception:
+                    self.stop(key)
+                    raise
+                print(f"{command[0]} ready on {describe(address)} after {waited:.2f}s.")
+            self.counts[key] += 1
+        return proc
+
+    def release(self, command: List[str]) -> None:
+        """ Drop a reference, stopping the process when none are left. """
+
+        key = tuple(command)
+        with self.lock:
+            self.counts[key] -= 1
+            if self.counts[key] <= 0:
+                self.stop(key)
+
+    def stop(self, key: Tuple[str, ...]) -> None:
+        """ Terminate one proxy, killing it if it doesn't exit promptly. """
+
+        proc = self.procs.pop(key, None)
+        self.counts.pop(key, None)
+        if proc is None or proc.poll() is not None:
+            return
+
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def stop_all(self) -> None:
+        """ Terminate every proxy still running. """
+        for key in list(self.procs):
+            self.stop(key)
+
+    def install_handlers(self) -> None:
+        """ Stop all proxies at exit and on SIGTERM. """
+
+        if self.handlers_installed:
+            return
+        self.handlers_installed = True
+        atexit.register(self.stop_all)
+
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            self.stop_all()
+            if callable(previous):
+                previous(signum, frame)
+            raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+
+PROXIES = ProxyManager()
+
+
+@contextmanager
+def cloud_sql_proxy(
+    command: List[str],
+    port: int = 5432,
+    host: str = "127.0.0.1",
+    timeout: float = 30.0,
+    socket_path: str = None,
+):
+    """
+    Use the shared proxy for ``command`` for the duration of the context.
+
+    The proxy is ready once it accepts connections on ``host:port``, or on
+    ``socket_path`` for a proxy serving a Unix socket.
+    """
+
+    address = socket_path if socket_path is not None else (host, port)
+    proc = PROXIES.acquire(command, address, timeout)
+    try:
+        yield proc
+    finally:
+        PROXIES.release(command)
@@ -0,0 +1,89 @@
+""" Delete intermediate files with a single, pruned, in-process directory scan. """
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from typing import Iterable, Tuple
+
+CLEAN_PATTERNS = ("*.pyc", "*.log")
+
+# Heavy directories that never hold files we want to clean.
+PRUNE_DIRS = (".git", "node_modules", "dist", ".venv", "venv", ".mypy_cache")
+
+
+def sweep_dir(
+    path: str, patterns: Iterable[str], prune: Iterable[str], dry_run: bool = False
+) -> Tuple[int, int]:
+    """
+    Remove files under ``path`` matching any of ``patterns``.
+
+    Directories named in ``prune`` are not entered. Returns the number of
+    files removed (or that would be removed) and their total size in bytes.
+    """
+
+    patterns = tuple(patterns)
+    prune = set(prune)
+    count = size = 0
+    stack = [path]
+
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in prune:
+                        stack.append(entry.path)
+                elif any(fnmatch(entry.name, pattern) for pattern in patterns):
+                    try:
+                        size += entry.stat(follow_symlinks=False).st_size
+                        if not dry_run:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    count += 1
+
+    return count, size
+
+
+def sweep(
+    root: str = ".",
+    patterns: Iterable[str] = CLEAN_PATTERNS,
+    prune: Iterable[str] = PRUNE_DIRS,
+    dry_run: bool = False,
+    jobs: int = 8,
+) -> Tuple[int, int]:
+    """ Like `sweep_dir`, but scan each top level directory of ``root`` concurrently. """
+
+    patterns = tuple(patterns)
+    prune = tuple(prune)
+
+    with os.scandir(root) as entries:
+        top = list(entries)
+
+    files = [entry for entry in top if not entry.is_dir(follow_symlinks=False)]
+    dirs = [
+        entry.path
+        for entry in top
+        if entry.is_dir(follow_symlinks=False) and entry.name not in prune
+    ]
+
+    count = size = 0
+    for entry in files:
+        if any(fnmatch(entry.name, pattern) for pattern in patterns):
+            size += entry.stat(follow_symlinks=False).st_size
+            if not dry_run:
+                os.remove(entry.path)
+            count += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for sub_count, sub_size in pool.map(
+            lambda path: sweep_dir(path, patterns, prune, dry_run), dirs
+        ):
+            count += sub_count
+            size += sub_size
+
+    return count, size
@@ -1,10 +1,16 @@
 """ Utility tasks for all the monorepo applications. """
+import hashlib
 import os
+import tempfile
 
-from dotenv import dotenv_values
-from invoke import task
+from invoke import Exit, task
 
-from tmp_copy import tmp_copy
+from .fingerprint import Fingerprint, context_files
+from .lint_cache import cached_lint
+from .spool import spooled_run
+from .sweep import CLEAN_PATTERNS, PRUNE_DIRS, sweep
+from .tmp_copy import tmp_copy, tmp_stage
+from .tracing import span
 
 # APP_NAME is the name of the  the root of your project's folder.
 # It will be defined by calling init_monorepo_tasks()
@@ -29,6 +35,16 @@ GCR_HOSTNAME = "us.gcr.io"
 
 TASKS_INITIALIZED = False
 
+# Lint command and the config files that change its results, per tool.
+LINTERS = {
+    "mypy": ("mypy --ignore-missing-imports", ["mypy.ini", "setup.cfg"]),
+    "pylint": ("pylint", [".pylintrc", "pylintrc", "setup.cfg"]),
+}
+
+# Checks that compare files with each other. Cached results are replayed per
+# file, which can't reproduce them, so they only run when linting uncached.
+CROSS_FILE_CHECKS = {"pylint": "--disable=duplicate-code,cyclic-import"}
+
 
 def init_monorepo_tasks(
     app_name: str,
@@ -118,6 +134,11 @@ def validate_env(env: str) -> bool:
     )
 
 
+def get_build_cache_dir() -> str:
+    """ Directory for build fingerprints and other cached state. """
+    return os.path.join(get_base_dir(), ".build_cache")
+
+
 def get_ng_build_env(env: str) -> str:
     """ Translate the env string for angular that uses a more verbose string. """
     return "production" if env == "prod" else ""
@@ -128,6 +149,23 @@ def get_default_secrets_path(env: str) -> str:
     return f"{get_app_dir()}/something.secret.{env}.env"
 
 
+RENDER_DIGEST_PREFIX = "# render-digest: "
+
+
+def get_render_digest(deploy_file_path: str) -> str:
+    """ The digest a rendered deploy yaml file was stamped with, or "". """
+
+    try:
+        with open(deploy_file_path) as in_file:
+            first_line = in_file.readline().rstrip("\n")
+    except OSError:
+        return ""
+
+    if first_line.startswith(RENDER_DIGEST_PREFIX):
+        return first_line[len(RENDER_DIGEST_PREFIX) :]
+    return ""
+
+
 def create_deploy_yaml_file(
     yaml_file_path: str,
     env: bool,
@@ -135,16 +173,43 @@ def create_deploy_yaml_file(
     service_name: str,
     cloud_sql_instances: str,
 ) -> str:
-    """ Merge env vars to app yaml. """
-    from ruamel.yaml import YAML, util
-
-    yaml = YAML()
+    """
+    Merge env vars to app yaml.
 
+    The output starts with a digest of every input. When the existing output
+    already carries the same digest it is reused as is, and later steps can
+    compare digests to spot a deploy that changes nothing.
+    """
     yaml_file_name = yaml_file_path.split("/")[-1]
     file_dir = "/".join(yaml_file_path.split("/")[:-1])
+    deploy_file_path = f"{file_dir}/deploy-{yaml_file_name}"
+
+    if secrets_file_path is None:
+        secrets_file_path = get_default_secrets_path(env)
+
+    digest = hashlib.sha256()
+    for path in (yaml_file_path, secrets_file_path):
+        try:
+            with open(path, "rb") as in_file:
+                digest.update(in_file.read())
+        except FileNotFoundError:
+            pass
+        digest.update(b"\0")
+    digest.update(f"{service_name}\0{cloud_sql_instances}".encode())
+    render_digest = digest.hexdigest()
+
+    if get_render_digest(deploy_file_path) == render_digest:
+        print(f"Reusing {deploy_file_path}, inputs unchanged ({render_digest[:12]}).")
+        return deploy_file_path
+
+    from dotenv import dotenv_values
+    from ruamel.yaml import YAML, util
+
+    yaml = YAML()
 
     # Open and read base app-engine.yaml file
-    config = util.load_yaml_guess_indent(open(yaml_file_path))[0]
+    with open(yaml_file_path) as in_file:
+        config = util.load_yaml_guess_indent(in_file)[0]
 
     if service_name:
         print(f"Using service_name: {service_name}")
@@ -153,9 +218,6 @@ def create_deploy_yaml_file(
         print(f"Using service_name: {config['service']}")
 
     # Open and read secret env variables
-    if secrets_file_path is None:
-        secrets_file_path = get_default_secrets_path(env)
-
     print(f"Using secrets_file_path: {secrets_file_path}")
     env_vars = dotenv_values(secrets_file_path)
 
@@ -171,22 +233,35 @@ def create_deploy_yaml_file(
     if cloud_sql_instances:
         config["beta_settings"]["cloud_sql_instances"] = cloud_sql_instances
 
-    deploy_file_path = f"{file_dir}/deploy-{yaml_file_name}"
-
-    # write to new file the updated yaml file
-    with open(deploy_file_path, "w") as out_file:
+    # Write the updated yaml next to the final file and rename it into place,
+    # so a concurrent reader never sees a half written file.
+    with tempfile.NamedTemporaryFile(
+        "w", dir=file_dir or ".", prefix=".deploy-", suffix=".tmp", delete=False
+    ) as out_file:
+        out_file.write(f"{RENDER_DIGEST_PREFIX}{render_digest}\n")
         yaml.dump(config, out_file)
+    os.replace(out_file.name, deploy_file_path)
 
     return deploy_file_path
 
 
-@task
-def clean(ctx):
+@task(
+    help={
+        "dry_run": "Only report what would be removed",
+        "skip": "Extra directory name to skip, may be given more than once",
+        "jobs": "How many top level directories to scan at the same time",
+    },
+    iterable=["skip"],
+)
+def clean(ctx, dry_run=False, skip=None, jobs=8):  # pylint: disable=unused-argument
     """ Remove intermediate files. """
 
-    ctx.run("find . -type f -name '*.pyc' -delete", echo=True)
-    ctx.run("find . -type f -name '*.log' -delete", echo=True)
+    count, size = sweep(
+        ".", CLEAN_PATTERNS, PRUNE_DIRS + tuple(skip or ()), dry_run=dry_run, jobs=jobs
+    )
 
+    verb = "Would remove" if dry_run else "Removed"
+    print(f"{verb} {count} files, freeing {size:,} bytes.")
     print("Cleaning Finished!")
 
 
@@ -206,6 +281,33 @@ def test(ctx):
     ctx.run("python manage.py test", echo=True)
 
 
+@task(
+    help={
+        "tool": f"One of: {', '.join(LINTERS)}",
+        "cache": "Replay results for files unchanged since the last run",
+        "path": "Directory with the app package and the lint config files",
+    }
+)
+def lint(ctx, tool="pylint", cache=True, path="."):
+    """ Lint the app package, re-analyzing only what changed since the last run. """
+
+    command, config_files = LINTERS[tool]
+    root = os.path.join(path, "app")
+    if not cache:
+        ctx.run(f"{command} {root}", echo=True)
+        return
+
+    code = cached_lint(
+        ctx,
+        f"{command} {CROSS_FILE_CHECKS.get(tool, '')}".strip(),
+        root,
+        [os.path.join(path, name) for name in config_files],
+        os.path.join(path, ".build_cache", "lint", f"{tool}.json"),
+    )
+    if code:
+        raise Exit(f"{tool} reported problems", code=code)
+
+
 @task
 def run(ctx):
     """ Run the application. """
@@ -220,40 +322,103 @@ def seed(ctx):
     ctx.run("python manage.py seed_db", echo=True)
 
 
-@task
-def docker_build(ctx, project=PROJECT, env="local"):
-    """ Build the application container with docker. """
+@task(
+    help={
+        "force": "Build even if nothing has changed since the last build",
+        "spool": "Keep only the tail of the build output in memory; the rest "
+        + "goes to a compressed log under .build_cache/logs",
+    }
+)
+def docker_build(ctx, project=PROJECT, env="local", force=False, spool=False):
+    """
+    Build the application container with docker, skipping unchanged images.
+
+    Compose runs from the monorepo root on the app's own `docker-compose.yaml`
+    while the app's Dockerfile is staged into a directory of its own, so builds
+    of different apps run side by side. The compose file must take its
+    Dockerfile from ``DOCKERFILE`` and its image name from ``IMAGE_URL``:
+
+        build:
+          context: .
+          dockerfile: ${DOCKERFILE:-apps/<app>/Dockerfile}
+        image: ${IMAGE_URL:-<app>}
+    """
+
+    validate_env(env)
+    image_url = f"{get_gcr_hostname()}/{project}/discoe/{get_image_name()}"
+
+    fingerprint = Fingerprint(
+        os.path.join(get_build_cache_dir(), "docker", f"{get_app_name()}-{env}.json")
+    )
+    # The build context is the monorepo root, so every tracked file there counts.
+    fingerprint.compute(
+        context_files(get_base_dir()),
+        {"env": env, "project": project, "image": image_url},
+    )
 
-    with ctx.cd(get_base_dir()), tmp_copy(f"{get_app_dir()}/Dockerfile"), tmp_copy(
-        f"{get_app_dir()}/docker-compose.yaml"
-    ):
-        validate_env(env)
+    if force:
+        reasons = ["--force given"]
+    else:
+        reasons = fingerprint.changes()
+        image_exists = ctx.run(f"docker image inspect {image_url}", hide=True, warn=True)
+        if not image_exists.ok:
+            reasons.append(f"image {image_url} not found locally")
+
+    if not reasons:
+        print(f"{image_url} is up to date ({fingerprint.digest[:12]}). Skipping build.")
+        return
+
+    print(f"Rebuilding {image_url}:")
+    for reason in reasons:
+        print(f"  {reason}")
+
+    compose_file = os.path.abspath(f"{get_app_dir()}/docker-compose.yaml")
+    with ctx.cd(get_base_dir()), tmp_stage(
+        f"{get_app_dir()}/Dockerfile",
+        dst_dir=os.path.join(get_build_cache_dir(), "stage"),
+        private=True,
+    ) as (dockerfile,):
         ng_build_env = get_ng_build_env(env)
-
-        ctx.run(
+        command = (
             f"export ENV={env} && export GCP_PROJECT_ID={project} && "
-            + f"export NG_BUILD_ENV={ng_build_env} && docker-compose build",
-            echo=True,
+            + f"export NG_BUILD_ENV={ng_build_env} && export IMAGE_URL={image_url} && "
+            + f"export DOCKERFILE={os.path.relpath(dockerfile, get_base_dir())} && "
+            + f"docker-compose -f {compose_file} --project-directory . build"
         )
 
+        if spool:
+            log_name = f"docker-build-{get_app_name()}-{env}.log.gz"
+            log_path = os.path.join(get_build_cache_dir(), "logs", log_name)
+            spooled_run(ctx, command, log_path, echo=True)
+        else:
+            ctx.run(command, echo=True)
+
+    fingerprint.save({"image": image_url})
+
 
 @task
 def docker_run(ctx, project=PROJECT, env="local"):
     """ Run the application container with docker. """
-    with ctx.cd(get_base_dir()), tmp_copy(f"{get_app_dir()}/docker-compose.yaml"):
+    # Compose reads the app's own file; nothing is staged, so a running app
+    # never holds up another app's build.
+    compose_file = os.path.abspath(f"{get_app_dir()}/docker-compose.yaml")
+    compose = f"docker-compose -f {compose_file} --project-directory ."
+    image_url = f"{get_gcr_hostname()}/{project}/discoe/{get_image_name()}"
+    with ctx.cd(get_base_dir()):
         validate_env(env)
         ng_build_env = get_ng_build_env(env)
 
         try:
             ctx.run(
                 f"export ENV={env} && export GCP_PROJECT_ID={project} && "
-                + f"export NG_BUILD_ENV={ng_build_env} && docker-compose up"
+                + f"export NG_BUILD_ENV={ng_build_env} && "
+                + f"export IMAGE_URL={image_url} && {compose} up"
             )
 
         finally:
             ctx.run(
                 f"export ENV={env} && export GCP_PROJECT_ID={project} && "
-                + f"docker-compose down"
+                + f"export IMAGE_URL={image_url} && {compose} down"
             )
 
 
@@ -281,13 +446,14 @@ def deploy(
     """ Deploy the container to GCP. """
 
     env = "prod"
-    deploy_yaml = create_deploy_yaml_file(
-        f"{get_app_dir()}/app-engine.yaml",
-        env,
-        secrets_file_path,
-        service_name,
-        cloud_sql_instances,
-    )
+    with span("render deploy yaml"):
+        deploy_yaml = create_deploy_yaml_file(
+            f"{get_app_dir()}/app-engine.yaml",
+            env,
+            secrets_file_path,
+            service_name,
+            cloud_sql_instances,
+        )
     with tmp_copy(deploy_yaml):
         if build:
             docker_build(ctx, project, env)
@@ -1,21 +1,145 @@
 """ Create a temporary copy of a path inside a context manager. """
+import fcntl
+import filecmp
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from os import path, remove
 from shutil import copyfile
 
+# ioctl request for a copy-on-write clone on Linux (btrfs, xfs, overlayfs...).
+FICLONE = 0x40049409
+
+STAGE_MODES = ("auto", "reflink", "hardlink", "symlink", "copy")
+
+
+def _reflink(src_path: str, dst_path: str) -> None:
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            remove(dst_path)
+            raise
+
+
+def _is_identical(src_path: str, dst_path: str) -> bool:
+    if not path.lexists(dst_path):
+        return False
+    if path.islink(dst_path):
+        return path.realpath(dst_path) == path.realpath(src_path)
+    return path.samefile(src_path, dst_path) or filecmp.cmp(
+        src_path, dst_path, shallow=False
+    )
+
+
+def stage_file(src_path: str, dst_path: str, mode: str = "auto") -> bool:
+    """
+    Put ``src_path`` at ``dst_path`` without copying bytes where possible.
+
+    ``auto`` tries a reflink, then a hardlink, then falls back to a copy.
+    Nothing is done when ``dst_path`` already has the same contents. Returns
+    True if a file was created.
+    """
+
+    if mode not in STAGE_MODES:
+        raise ValueError(f"mode: {mode} is invalid. mode must be one of {STAGE_MODES}")
+
+    if _is_identical(src_path, dst_path):
+        return False
+
+    if path.lexists(dst_path):
+        remove(dst_path)
+
+    if mode == "symlink":
+        os.symlink(path.abspath(src_path), dst_path)
+        return True
+
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src_path, dst_path)
+            return True
+        except OSError:
+            if mode == "reflink":
+                raise
+
+    if mode in ("auto", "hardlink"):
+        try:
+            os.link(src_path, dst_path)
+            return True
+        except OSError:
+            if mode == "hardlink":
+                raise
+
+    copyfile(src_path, dst_path)
+    return True
+
+
+@contextmanager
+def tmp_stage(
+    *src_paths: str, dst_dir: str = ".", mode: str = "auto", private: bool = False
+):
+    """
+    Stage several files into ``dst_dir`` for the duration of the context.
+
+    With ``private`` the files go into a new directory of their own under
+    ``dst_dir``, so concurrent builds never touch each other's staged files and
+    nothing waits; point the tools at the yielded paths. Otherwise they go
+    straight into ``dst_dir``, under an exclusive lock on it held until exit,
+    so two builds staging a `Dockerfile` there take turns. On exit only what
+    this context created is removed.
+
+    The default ``auto`` mode may hardlink, so a staged file can be the source
+    file itself: treat staged files as read-only, or pass ``mode="copy"``.
+    """
+
+    if private:
+        os.makedirs(dst_dir, exist_ok=True)
+        stage_dir = tempfile.mkdtemp(prefix="stage-", dir=dst_dir)
+        try:
+            staged = [path.join(stage_dir, path.basename(src)) for src in src_paths]
+            for src_path, dst_path in zip(src_paths, staged):
+                stage_file(src_path, dst_path, mode)
+            yield staged
+        finally:
+            shutil.rmtree(stage_dir, ignore_errors=True)
+        return
+
+    with open(path.join(dst_dir, ".tmp_stage.lock"), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        created = []
+        try:
+            for src_path in src_paths:
+                dst_path = path.join(dst_dir, path.basename(src_path))
+                if stage_file(src_path, dst_path, mode):
+                    created.append(dst_path)
+            yield [path.join(dst_dir, path.basename(src)) for src in src_paths]
+        finally:
+            for dst_path in created:
+                remove(dst_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
 
 class tmp_copy:  # pylint: disable=invalid-name
-    """ Create a temporary copy of a path inside a context manager. """
+    """
+    Create a temporary copy of a path inside a context manager.
+
+    The copy is a real copy unless ``mode`` asks for a link, see `stage_file()`;
+    a hardlinked or symlinked "copy" changes the source when written to.
+    """
 
-    def __init__(self, src_path: str, dst_path: str = "."):
+    def __init__(self, src_path: str, dst_path: str = ".", mode: str = "copy"):
 
         self.src_path = src_path
         _, filename = path.split(src_path)
         self.dst_path = path.join(dst_path, filename)
-        copyfile(src_path, self.dst_path)
+        self.created = stage_file(src_path, self.dst_path, mode)
 
     def __enter__(self):
         return self
 
     def __exit__(self, _, value, traceback):
 
-        remove(self.dst_path)
+        if self.created:
+            remove(self.dst_path)
@@ -1,7 +1,73 @@
-""" Temporarily change your python cwd. """
+""" Temporarily change your python cwd.
+
+`tmp_cwd` changes the working directory of the whole process with `os.chdir`,
+so two tasks that each need their own directory can never run side by side.
+`scoped_cwd` keeps the directory in a context variable instead, for the
+current thread or asyncio task only. It is honored by:
+
+* commands, when the invoke context is passed in (`scoped_cwd(path, ctx)`),
+* file helpers, via `cwd_path()` and `cwd_open()`,
+* top level imports, which look in the scoped directory first, the same way
+  `''` on `sys.path` looks in the process cwd.
+
+asyncio tasks inherit the directory of the code that created them. New
+threads start without one (and fall back to `os.getcwd()`), so hand work to a
+thread pool with `contextvars.copy_context().run` to carry the directory over.
+`sys.modules` is still shared by the whole process, so two scoped directories
+must not hold different modules of the same name.
+
+`scoped_cwd` does not `os.chdir`: code that opens relative paths itself (an
+app's config, secrets or .env files) still sees the process cwd. Run such code
+under `process_cwd`, which does change it, but only ever to one directory at
+a time, so tasks in other directories wait instead of breaking each other.
+"""
 
 import os
-from contextlib import contextmanager
+import sys
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from importlib.machinery import PathFinder
+
+_CWD: ContextVar = ContextVar("monorepo_invoke_cwd", default=None)
+
+# How many `scoped_cwd` scopes are open; `CwdFinder` is only installed while
+# there is at least one.
+_SCOPES = {"open": 0}
+_SCOPES_LOCK = threading.Lock()
+
+# The directory `process_cwd` moved the process to, and how many hold it there.
+_PROCESS_CWD = {"path": None, "previous": None, "holders": 0}
+_PROCESS_CWD_CHANGED = threading.Condition()
+_HOLDS_PROCESS_CWD: ContextVar = ContextVar("monorepo_invoke_holds_cwd", default=None)
+
+
+def get_cwd() -> str:
+    """ The scoped working directory, or the process cwd outside any `scoped_cwd`. """
+    return _CWD.get() or os.getcwd()
+
+
+def cwd_path(*parts: str) -> str:
+    """ Resolve a path relative to the scoped working directory. """
+    return os.path.join(get_cwd(), *parts)
+
+
+def cwd_open(file_path: str, *args, **kwargs):
+    """ `open()` with relative paths resolved against the scoped working directory. """
+    return open(cwd_path(file_path), *args, **kwargs)
+
+
+class CwdFinder:  # pylint: disable=too-few-public-methods
+    """ Meta path finder that looks for top level modules in the scoped cwd. """
+
+    @classmethod
+    def find_spec(cls, fullname, path=None, target=None):
+        """ Find ``fullname`` in the scoped cwd, if one is set. """
+
+        cwd = _CWD.get()
+        if cwd is None or path is not None:
+            return None
+        return PathFinder.find_spec(fullname, [cwd], target)
 
 
 @contextmanager
@@ -9,7 +75,74 @@ def tmp_cwd(path):
     """ Change the cwd of your currently executing progam. """
     oldpwd = os.getcwd()
     os.chdir(path)
+    # Keep `get_cwd()` in step when called inside a `scoped_cwd`.
+    token = _CWD.set(os.getcwd())
     try:
         yield
     finally:
+        _CWD.reset(token)
         os.chdir(oldpwd)
+
+
+@contextmanager
+def scoped_cwd(path, ctx=None):
+    """ Change the cwd of your currently executing thread or asyncio task. """
+
+    with _SCOPES_LOCK:
+        if not _SCOPES["open"]:
+            sys.meta_path.insert(0, CwdFinder)
+        _SCOPES["open"] += 1
+
+    new_cwd = os.path.abspath(os.path.join(get_cwd(), path))
+    token = _CWD.set(new_cwd)
+    try:
+        with ExitStack() as stack:
+            if ctx is not None:
+                stack.enter_context(ctx.cd(new_cwd))
+            yield new_cwd
+    finally:
+        _CWD.reset(token)
+        with _SCOPES_LOCK:
+            _SCOPES["open"] -= 1
+            if not _SCOPES["open"]:
+                sys.meta_path.remove(CwdFinder)
+
+
+@contextmanager
+def process_cwd(path, ctx=None):
+    """
+    `scoped_cwd`, plus an `os.chdir` of the whole process for in-process code.
+
+    Any number of threads or tasks may hold the same directory at once, so
+    tasks of one app still run side by side. One asking for another directory
+    blocks until the last holder leaves, so the process cwd never changes
+    under code that relies on it. Nesting a different directory inside a
+    `process_cwd` would wait for itself, so it raises instead.
+    """
+
+    new_cwd = os.path.abspath(os.path.join(get_cwd(), path))
+    held = _HOLDS_PROCESS_CWD.get()
+    if held is not None and held != new_cwd:
+        raise RuntimeError(f"process_cwd({new_cwd!r}) inside process_cwd({held!r})")
+
+    with _PROCESS_CWD_CHANGED:
+        _PROCESS_CWD_CHANGED.wait_for(
+            lambda: not _PROCESS_CWD["holders"] or _PROCESS_CWD["path"] == new_cwd
+        )
+        if not _PROCESS_CWD["holders"]:
+            _PROCESS_CWD.update(path=new_cwd, previous=os.getcwd())
+            os.chdir(new_cwd)
+        _PROCESS_CWD["holders"] += 1
+
+    token = _HOLDS_PROCESS_CWD.set(new_cwd)
+    try:
+        with scoped_cwd(new_cwd, ctx) as scoped:
+            yield scoped
+    finally:
+        _HOLDS_PROCESS_CWD.reset(token)
+        with _PROCESS_CWD_CHANGED:
+            _PROCESS_CWD["holders"] -= 1
+            if not _PROCESS_CWD["holders"]:
+                os.chdir(_PROCESS_CWD["previous"])
+                _PROCESS_CWD["path"] = None
+                _PROCESS_CWD_CHANGED.notify_all()
@@ -0,0 +1,171 @@
+"""
+Record how long tasks and their commands take, as a Chrome trace.
+
+    $ python -m monorepo_invoke.tracing --trace deploy.json deploy --project p
+
+works like `inv`, and writes every task (pre and post tasks and tasks called
+from other tasks included) and every `ctx.run` as nested spans with wall and
+CPU time. Open the file in chrome://tracing or https://ui.perfetto.dev.
+Without --trace nothing is wrapped, so tasks run exactly as under `inv`.
+"""
+
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from invoke import Argument, Executor, Program
+from invoke.runners import Local
+
+from .jsonfile import atomic_write_json
+
+
+class Tracer:
+    """ Completed spans, as Chrome trace "complete" events. """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def start(self) -> None:
+        """ Begin recording, with time zero now. """
+
+        self.enabled = True
+        self.events = []
+        self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str = "task", **args):
+        """ Record the body as a span named ``name``, if recording. """
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        cpu = time.process_time()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            child_cpu = (after.ru_utime + after.ru_stime) - (
+                children.ru_utime + children.ru_stime
+            )
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": dict(
+                    args,
+                    wall_ms=round((end - start) * 1000, 3),
+                    cpu_ms=round((time.process_time() - cpu) * 1000, 3),
+                    child_cpu_ms=round(child_cpu * 1000, 3),
+                ),
+            }
+            with self.lock:
+                self.events.append(event)
+
+    def write(self, path: str) -> None:
+        """ Save the spans as Chrome trace-event json, atomically. """
+
+        atomic_write_json(path, {"traceEvents": self.events, "displayTimeUnit": "ms"})
+
+
+TRACER = Tracer()
+
+
+def span(name: str, category: str = "step", **args):
+    """ A span around a step inside a task; free when not tracing. """
+
+    return TRACER.span(name, category, **args)
+
+
+class TracingLocal(Local):
+    """ The local runner, recording each command as a span. """
+
+    def run(self, command, **kwargs):
+        name = command if len(command) <= 80 else command[:77] + "..."
+        with TRACER.span(name, "run", command=command):
+            return super().run(command, **kwargs)
+
+
+def traced_tasks(collection):
+    """ Every task in ``collection`` and its sub-collections. """
+
+    yield from collection.tasks.values()
+    for sub_collection in collection.collections.values():
+        yield from traced_tasks(sub_collection)
+
+
+def trace_body(task) -> None:
+    """ Wrap ``task``'s body in a span, once. """
+
+    body = task.body
+    if getattr(body, "traced", False):
+        return
+
+    @wraps(body)
+    def traced(*args, **kwargs):
+        arguments = {name: repr(value) for name, value in kwargs.items()}
+        with TRACER.span(task.name, "task", arguments=arguments):
+            return body(*args, **kwargs)
+
+    traced.traced = True
+    task.body = traced
+
+
+class TracingExecutor(Executor):
+    """ An executor that records a trace when --trace is given. """
+
+    def __init__(self, collection, config=None, core=None):
+        super().__init__(collection, config, core)
+        self.trace_path = core[0].args.trace.value if core else None
+
+    def execute(self, *tasks):
+        if not self.trace_path:
+            return super().execute(*tasks)
+
+        TRACER.start()
+        for task in traced_tasks(self.collection):
+            trace_body(task)
+        self.config.runners.local = TracingLocal
+
+        names = [getattr(task, "name", task) for task in tasks]
+        try:
+            with TRACER.span(f"inv {' '.join(map(str, names))}", "invoke"):
+                return super().execute(*tasks)
+        finally:
+            TRACER.write(self.trace_path)
+            print(f"Trace of {len(TRACER.events)} spans written to {self.trace_path}")
+
+
+class TracingProgram(Program):
+    """ An `inv` lookalike with a `--trace FILE` core flag. """
+
+    def core_args(self):
+        return super().core_args() + [
+            Argument(
+                names=("trace",),
+                help="Write a Chrome trace of every task and command to FILE.",
+            )
+        ]
+
+
+program = TracingProgram(executor_class=TracingExecutor)  # pylint: disable=invalid-name
+
+if __name__ == "__main__":
+    # Run the imported module's program, so tasks' `span` calls and this
+    # program share one TRACER rather than one per copy of the module.
+    from importlib import import_module
+
+    import_module(__spec__.name).program.run()
@@ -0,0 +1,82 @@
+""" High-water marks for incremental ETL jobs, kept in the job's own database.
+
+The marks live in the `etl_watermarks` table, which the app's migrations
+create; see `etl_state`.
+"""
+
+import hashlib
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def ruleset_digest(definition) -> str:
+    """ A stable digest of a json friendly ruleset definition. """
+
+    encoded = json.dumps(definition, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def read_watermark(session, job: str) -> Tuple[Optional[datetime], Optional[str]]:
+    """ The last recorded watermark and ruleset digest for ``job``, if any. """
+    from sqlalchemy import select
+
+    from .etl_state import WATERMARKS
+
+    row = session.execute(
+        select(WATERMARKS.c.watermark, WATERMARKS.c.ruleset_digest).where(
+            WATERMARKS.c.job == job
+        )
+    ).fetchone()
+
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
+def database_now(session) -> datetime:
+    """ The database's current time, as seen by ``session``. """
+    from sqlalchemy import func, select
+
+    return session.execute(select(func.current_timestamp())).scalar()
+
+
+def write_watermark(session, job: str, watermark: datetime, digest: str) -> None:
+    """ Record ``watermark`` and ``digest`` for ``job`` and commit. """
+    from .etl_state import WATERMARKS
+
+    session.execute(WATERMARKS.delete().where(WATERMARKS.c.job == job))
+    session.execute(
+        WATERMARKS.insert().values(job=job, watermark=watermark, ruleset_digest=digest)
+    )
+    session.commit()
+
+
+@contextmanager
+def incremental_run(session, job: str, definition):
+    """
+    Yield the time since which sources must be rescanned, or None for a full rebuild.
+
+    A full rebuild is needed the first time ``job`` runs and whenever the
+    ruleset ``definition`` has changed. The start time of this run becomes the
+    new watermark once the body finishes without error, so rows changed while
+    the job runs are picked up next time. It is the database's clock, the same
+    one that stamps the rows, so a skewed task host can't skip changes.
+    """
+
+    started = database_now(session)
+    digest = ruleset_digest(definition)
+    since, old_digest = read_watermark(session, job)
+
+    if since is None:
+        print(f"{job}: no watermark recorded, doing a full rebuild.")
+    elif old_digest != digest:
+        print(f"{job}: ruleset definition changed, doing a full rebuild.")
+        since = None
+    else:
+        print(f"{job}: refreshing entries changed since {since.isoformat()}.")
+
+    yield since
+
+    write_watermark(session, job, started, digest)
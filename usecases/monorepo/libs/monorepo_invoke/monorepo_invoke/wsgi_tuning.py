@@ -0,0 +1,182 @@
+""" Size gunicorn from the host and a profile, and measure it under concurrent load. """
+
+import http.client
+import os
+import shlex
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .sql_proxy import wait_for_port
+
+# How to size gunicorn per kind of app:
+#   cpu: sync workers, the classic (2 x cores) + 1.
+#   io:  threaded workers, one per core plus one, each with several threads,
+#        for apps that mostly wait on the database or other services.
+#   dev: a single sync worker.
+PROFILES = {
+    "cpu": {"worker_class": "sync", "workers_per_cpu": 2, "extra": 1, "threads": 1},
+    "io": {"worker_class": "gthread", "workers_per_cpu": 1, "extra": 1, "threads": 4},
+    "dev": {"worker_class": "sync", "workers_per_cpu": 0, "extra": 1, "threads": 1},
+}
+
+# A stand-in app for benchmarks, so they need neither the real app nor its db.
+BENCH_APP = "monorepo_invoke.bench_app:create_app('bench')"
+
+
+def cpu_count() -> int:
+    """ Cores this process may use, respecting CPU affinity where available. """
+
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def gunicorn_settings(
+    profile: str = "cpu", workers: int = 0, threads: int = 0, cpus: int = 0
+) -> Dict[str, object]:
+    """ Workers, worker class and threads for ``profile``; non-zero arguments win. """
+
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown profile {profile}; expected one of {', '.join(PROFILES)}"
+        )
+
+    settings = PROFILES[profile]
+    cpus = cpus or cpu_count()
+    return {
+        "workers": workers or settings["workers_per_cpu"] * cpus + settings["extra"],
+        "worker_class": settings["worker_class"],
+        "threads": threads or settings["threads"],
+    }
+
+
+def gunicorn_command(app: str, bind: str, settings: Dict[str, object]) -> str:
+    """ The gunicorn command line serving ``app`` on ``bind`` with ``settings``. """
+
+    return (
+        f"gunicorn --bind {bind} --workers {settings['workers']} "
+        + f"--worker-class {settings['worker_class']} --threads {settings['threads']} "
+        + shlex.quote(app)
+    )
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """ The value below which ``fraction`` of ``sorted_values`` fall (nearest rank). """
+
+    if not sorted_values:
+        return 0.0
+    rank = round(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def drive_load(
+    host: str,
+    port: int,
+    path: str,
+    requests: int,
+    concurrency: int,
+    timeout: float = 30.0,
+) -> Dict[str, float]:
+    """
+    Send ``requests`` GETs for ``path`` from ``concurrency`` keep-alive clients.
+
+    Returns successful requests per second and their p50/p95/p99 latency in
+    milliseconds, plus the number and fraction of failed requests: errors and
+    responses with a 4xx or 5xx status. Failures are left out of the
+    throughput and latencies, so a server failing fast doesn't look fast.
+    """
+
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        mine, failed = [], 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                ok = False
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            if ok:
+                mine.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / max(elapsed, 1e-9),
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "errors": errors[0],
+        "error_rate": errors[0] / max(requests, 1),
+    }
+
+
+def bench_gunicorn(
+    command: str,
+    host: str,
+    port: int,
+    path: str = "/",
+    requests: int = 2000,
+    concurrency: int = 16,
+    env: Optional[Dict[str, str]] = None,
+) -> Dict[str, float]:
+    """ Start ``command``, wait for ``host:port``, load it, then stop it. """
+
+    proc = subprocess.Popen(
+        shlex.split(command),
+        env=dict(os.environ, **(env or {})),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(host, port, proc=proc)
+        # A few requests first, so worker start up isn't counted as latency.
+        drive_load(host, port, path, concurrency, concurrency)
+        return drive_load(host, port, path, requests, concurrency)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def format_load_report(settings: Dict[str, object], result: Dict[str, float]) -> str:
+    """ One line describing a benchmark run. """
+
+    return (
+        f"{settings['workers']} x {settings['worker_class']} "
+        + f"({settings['threads']} threads): {result['rps']:.0f} req/s, "
+        + f"p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms, "
+        + f"p99 {result['p99']:.1f} ms; {result['errors']:.0f} errors "
+        + f"({result['error_rate']:.1%}) not counted"
+    )
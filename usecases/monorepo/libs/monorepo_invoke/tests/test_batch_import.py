@@ -0,0 +1,94 @@
+""" Streaming imports load every source row exactly once, across reruns and crashes. """
+
+import csv
+from functools import partial
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, func
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from monorepo_invoke.batch_import import csv_source, stream_import
+from monorepo_invoke.etl_state import add_etl_tables
+
+ROWS = 10
+
+metadata = MetaData()
+PRICES = Table(
+    "prices",
+    metadata,
+    Column("sku", String(20), primary_key=False),
+    Column("price", Integer),
+)
+add_etl_tables(metadata)
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'etl.db'}")
+    metadata.create_all(engine)
+    with Session(engine) as db_session:
+        yield db_session
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "prices.csv"
+    with open(path, "w", newline="") as out_file:
+        writer = csv.DictWriter(out_file, ["sku", "price"])
+        writer.writeheader()
+        writer.writerows({"sku": f"sku{n}", "price": n} for n in range(ROWS))
+    return str(path)
+
+
+def convert(row):
+    return {"sku": row["sku"], "price": int(row["price"])}
+
+
+def replace(session):
+    session.execute(PRICES.delete())
+
+
+def load(session, source_file, **kwargs):
+    kwargs.setdefault("convert", convert)
+    return stream_import(
+        session,
+        "prices",
+        partial(csv_source, source_file),
+        table="prices",
+        columns=["sku", "price"],
+        batch_size=3,
+        **kwargs,
+    )
+
+
+def loaded_skus(session):
+    return sorted(session.execute(select(PRICES.c.sku)).scalars())
+
+
+def test_rerunning_a_finished_import_does_not_duplicate_rows(session, source_file):
+    assert load(session, source_file) == ROWS
+
+    with pytest.raises(RuntimeError, match="give replace"):
+        load(session, source_file)
+    assert session.execute(select(func.count()).select_from(PRICES)).scalar() == ROWS
+
+    assert load(session, source_file, replace=replace) == ROWS
+    assert loaded_skus(session) == sorted(f"sku{n}" for n in range(ROWS))
+
+
+def test_resuming_after_a_crash_loads_the_rest_once(session, source_file):
+    def crash_at_sku7(row):
+        if row["sku"] == "sku7":
+            raise RuntimeError("crashed")
+        return convert(row)
+
+    with pytest.raises(RuntimeError, match="crashed"):
+        load(session, source_file, convert=crash_at_sku7)
+    session.rollback()
+    # The two batches before the crash are committed, the third is not.
+    assert len(loaded_skus(session)) == 6
+
+    assert load(session, source_file, resume=True) == ROWS - 6
+    assert loaded_skus(session) == sorted(f"sku{n}" for n in range(ROWS))
+    assert load(session, source_file, resume=True) == 0
@@ -0,0 +1,38 @@
+""" Which files of a docker build context count toward its fingerprint. """
+
+import subprocess
+
+from monorepo_invoke.fingerprint import context_files, dockerignore
+
+
+def test_only_tracked_files_not_dockerignored_count(tmp_path):
+    for name in ("Dockerfile", "main.py", "docs/README.md", ".dockerignore"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text(name)
+    (tmp_path / ".dockerignore").write_text("docs\n")
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(["git", "add", "."], cwd=tmp_path, check=True)
+
+    # Generated and untracked files never count.
+    (tmp_path / ".pytest_cache").mkdir()
+    (tmp_path / ".pytest_cache" / "state").write_text("changes every run")
+    (tmp_path / "deploy-app-engine.yaml").write_text("rendered")
+
+    files = context_files(str(tmp_path))
+    assert [path[len(str(tmp_path)) + 1 :] for path in files] == [
+        ".dockerignore",
+        "Dockerfile",
+        "main.py",
+    ]
+
+
+def test_dockerignore_rules(tmp_path):
+    (tmp_path / ".dockerignore").write_text(
+        "# comment\n**/*.md\n*.env\n!keep.env\nbuild/**/tmp\n"
+    )
+    excluded = dockerignore(str(tmp_path))
+
+    assert excluded("README.md") and excluded("a/b/notes.md")
+    assert excluded("prod.env") and not excluded("keep.env")
+    assert excluded("build/x/y/tmp/file") and excluded("build/tmp")
+    assert not excluded("main.py") and not excluded("sub/prod.env")
@@ -0,0 +1,15 @@
+""" `import monorepo_invoke` stays cheap enough to run on every `inv` call. """
+
+from check_import_time import BUDGET_MS, HEAVY_MODULES, heavy_imports, measure
+
+
+def test_import_time_within_budget():
+    # Best of a few runs, to keep noise on busy CI machines out of the result.
+    elapsed = min(measure() for _ in range(5))
+    assert elapsed <= BUDGET_MS, (
+        f"import monorepo_invoke took {elapsed:.1f} ms (budget {BUDGET_MS:.1f} ms)"
+    )
+
+
+def test_no_heavy_modules_imported():
+    assert heavy_imports() == [], f"only lazy imports allowed for {HEAVY_MODULES}"
@@ -0,0 +1,86 @@
+""" The test Postgres is the compose service's, not whatever answers on the port. """
+
+import socket
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from monorepo_invoke.local_pg import ensure_local_pg
+
+COMPOSE = "docker-compose-test.yaml"
+
+
+class FakePostgres:
+    """ A TCP server that answers SSLRequest with "N", like Postgres does. """
+
+    def __init__(self, port=0):
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.recv(8)
+                conn.sendall(b"N")
+
+    def close(self):
+        self.server.close()
+
+
+class FakeContext:
+    """ Answers the docker commands as if the compose service were running or not. """
+
+    def __init__(self, running, on_up=None):
+        self.running = running
+        self.on_up = on_up
+        self.commands = []
+
+    def run(self, command, **kwargs):  # pylint: disable=unused-argument
+        self.commands.append(command)
+        if command.endswith(" ps -q"):
+            return SimpleNamespace(ok=True, stdout="c0ffee\n" if self.running else "")
+        if command.startswith("docker inspect"):
+            return SimpleNamespace(ok=True, stdout="true\n")
+        if command.endswith(" up -d") and self.on_up is not None:
+            self.on_up()
+        return SimpleNamespace(ok=True, stdout="")
+
+
+@pytest.fixture
+def fake_pg():
+    server = FakePostgres()
+    yield server
+    server.close()
+
+
+def test_another_postgres_on_the_port_is_refused(fake_pg):
+    ctx = FakeContext(running=False)
+    with pytest.raises(RuntimeError, match="Another Postgres"):
+        ensure_local_pg(ctx, COMPOSE, port=fake_pg.port, timeout=5)
+    assert not any(command.endswith(" up -d") for command in ctx.commands)
+
+
+def test_running_service_is_only_waited_for(fake_pg):
+    ctx = FakeContext(running=True)
+    assert ensure_local_pg(ctx, COMPOSE, port=fake_pg.port, timeout=5) is False
+    assert not any(command.endswith(" up -d") for command in ctx.commands)
+
+
+def test_stopped_service_is_started_and_waited_for():
+    servers = []
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    ctx = FakeContext(running=False, on_up=lambda: servers.append(FakePostgres(port)))
+    try:
+        assert ensure_local_pg(ctx, COMPOSE, port=port, timeout=5) is True
+    finally:
+        for server in servers:
+            server.close()
@@ -0,0 +1,82 @@
+""" Sharded jobs resume after a crash, but never from a stale checkpoint. """
+
+import json
+import os
+import sqlite3
+import time
+from functools import partial
+
+import pytest
+
+from monorepo_invoke.jsonfile import atomic_write_json
+from monorepo_invoke.shards import Checkpoint, run_shards
+
+SHARDS = 4
+ROWS_PER_SHARD = 5
+
+
+def write_shard(db_path, crash_shard, shard, shard_count):
+    """ Stand-in for an ETL shard: write its rows in one SQLite transaction. """
+
+    if shard == crash_shard:
+        raise RuntimeError(f"shard {shard} crashed")
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS runs (shard INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS rows (shard INTEGER, n INTEGER)")
+        conn.execute("INSERT INTO runs VALUES (?)", (shard,))
+        conn.executemany(
+            "INSERT INTO rows VALUES (?, ?)",
+            [(shard, n) for n in range(ROWS_PER_SHARD)],
+        )
+    return ROWS_PER_SHARD
+
+
+def shards_run(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(shard for (shard,) in conn.execute("SELECT shard FROM runs"))
+
+
+def test_rerun_after_a_crash_only_runs_what_is_left(tmp_path):
+    db_path = str(tmp_path / "etl.db")
+    checkpoint_path = str(tmp_path / ".checkpoints" / "job.json")
+
+    crashing = partial(write_shard, db_path, 2)
+    with pytest.raises(RuntimeError, match="shard 2 crashed"):
+        run_shards(crashing, SHARDS, 2, Checkpoint(checkpoint_path, "job"))
+    assert shards_run(db_path) == [0, 1, 3]
+    with open(checkpoint_path) as in_file:
+        assert sorted(json.load(in_file)["done"]) == ["0", "1", "3"]
+
+    working = partial(write_shard, db_path, None)
+    total = run_shards(working, SHARDS, 2, Checkpoint(checkpoint_path, "job"))
+    assert total == SHARDS * ROWS_PER_SHARD
+    assert shards_run(db_path) == [0, 1, 2, 3]
+    assert not os.path.exists(checkpoint_path)
+
+
+def test_stale_or_foreign_checkpoints_are_ignored(tmp_path):
+    checkpoint_path = str(tmp_path / "job.json")
+    hours_ago = time.time() - 2 * 3600
+    record = {"key": "job", "started": hours_ago, "done": {0: 5}}
+    atomic_write_json(checkpoint_path, record)
+
+    assert Checkpoint(checkpoint_path, "job", max_age=3600).done == {}
+    assert Checkpoint(checkpoint_path, "other job").done == {}
+    assert Checkpoint(checkpoint_path, "job").done == {0: 5}
+
+    db_path = str(tmp_path / "etl.db")
+    checkpoint = Checkpoint(checkpoint_path, "job", max_age=3600)
+    run_shards(partial(write_shard, db_path, None), SHARDS, 2, checkpoint)
+    assert shards_run(db_path) == [0, 1, 2, 3]
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    atomic_write_json(path, {"done": {"0": 5}})
+
+    with pytest.raises(TypeError):
+        atomic_write_json(path, {"done": {"0": 5}, "bad": object()})
+
+    with open(path) as in_file:
+        assert json.load(in_file) == {"done": {"0": 5}}
+    assert os.listdir(str(tmp_path)) == ["state.json"]
@@ -0,0 +1,59 @@
+""" The shared proxy is ready before use, and never confused with another one. """
+
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from monorepo_invoke.sql_proxy import ProxyManager, cloud_sql_proxy, wait_for_address
+
+# Stands in for cloud_sql_proxy: serves a TCP port until terminated.
+STAND_IN = """
+import socket, sys, time
+time.sleep(0.2)
+server = socket.create_server(("127.0.0.1", int(sys.argv[1])))
+while True:
+    server.accept()[0].close()
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stand_in(port):
+    return [sys.executable, "-c", STAND_IN, str(port)]
+
+
+def test_proxy_is_ready_shared_and_stopped():
+    port = free_port()
+    command = stand_in(port)
+
+    with cloud_sql_proxy(command, port=port) as proc:
+        with socket.create_connection(("127.0.0.1", port), timeout=1):
+            pass
+        with cloud_sql_proxy(command, port=port) as nested:
+            assert nested is proc
+        assert proc.poll() is None
+
+    assert proc.poll() is not None
+
+
+def test_port_held_by_a_leftover_proxy_is_refused():
+    with socket.create_server(("127.0.0.1", 0)) as leftover:
+        port = leftover.getsockname()[1]
+        with pytest.raises(RuntimeError, match="already in use"):
+            ProxyManager().acquire(stand_in(port), ("127.0.0.1", port), timeout=5)
+
+
+def test_exited_proxy_is_not_ready_while_another_one_answers():
+    proc = subprocess.Popen([sys.executable, "-c", "import sys; sys.exit(3)"])
+    proc.wait()
+
+    with socket.create_server(("127.0.0.1", 0)) as other:
+        address = other.getsockname()
+        with pytest.raises(RuntimeError, match="exited with 3"):
+            wait_for_address(address, timeout=5, proc=proc)
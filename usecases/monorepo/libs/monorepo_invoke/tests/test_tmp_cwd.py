@@ -0,0 +1,162 @@
+""" Many tasks running side by side, each in a working directory of its own. """
+
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+import pytest
+from invoke import Context
+
+from monorepo_invoke.tmp_cwd import (
+    CwdFinder,
+    cwd_open,
+    cwd_path,
+    get_cwd,
+    process_cwd,
+    scoped_cwd,
+    tmp_cwd,
+)
+
+TASKS = 24
+
+
+@pytest.fixture
+def task_dirs(tmp_path):
+    """ One directory per task, each with a data file and a module of its own. """
+
+    dirs = []
+    for index in range(TASKS):
+        task_dir = tmp_path / f"task{index}"
+        task_dir.mkdir()
+        (task_dir / "data.txt").write_text(f"task{index}")
+        (task_dir / f"cwd_module_{index}.py").write_text(f"NAME = 'task{index}'\n")
+        dirs.append(str(task_dir))
+    return dirs
+
+
+def run_task(index, task_dir, barrier):
+    """ Read, import and run a command relative to the scoped directory. """
+
+    ctx = Context()
+    with scoped_cwd(task_dir, ctx):
+        # Every task is inside its scoped_cwd before any of them looks around.
+        barrier.wait()
+        with cwd_open("data.txt") as in_file:
+            data = in_file.read()
+        module = import_module(f"cwd_module_{index}")
+        pwd = ctx.run("pwd", hide=True, in_stream=False).stdout.strip()
+        return data, module.NAME, os.path.realpath(pwd), get_cwd()
+
+
+def test_threads_each_see_their_own_directory(task_dirs):
+    before = os.getcwd()
+    barrier = threading.Barrier(TASKS)
+    with ThreadPoolExecutor(TASKS) as pool:
+        futures = [
+            pool.submit(run_task, index, task_dir, barrier)
+            for index, task_dir in enumerate(task_dirs)
+        ]
+        results = [future.result(timeout=60) for future in futures]
+
+    for index, (data, name, pwd, cwd) in enumerate(results):
+        assert data == name == f"task{index}"
+        assert pwd == os.path.realpath(task_dirs[index])
+        assert cwd == task_dirs[index]
+    assert os.getcwd() == before
+
+
+def test_asyncio_tasks_each_see_their_own_directory(task_dirs):
+    async def read_later(task_dir):
+        with scoped_cwd(task_dir):
+            await asyncio.sleep(0.01)
+            with cwd_open("data.txt") as in_file:
+                return in_file.read(), cwd_path("data.txt")
+
+    async def main():
+        return await asyncio.gather(*(read_later(path) for path in task_dirs))
+
+    for index, (data, path) in enumerate(asyncio.run(main())):
+        assert data == f"task{index}"
+        assert path == os.path.join(task_dirs[index], "data.txt")
+
+
+def test_nested_scoped_cwd_is_relative_and_restored(tmp_path):
+    (tmp_path / "inner").mkdir()
+    with scoped_cwd(str(tmp_path)):
+        with scoped_cwd("inner") as inner:
+            assert inner == str(tmp_path / "inner")
+        assert get_cwd() == str(tmp_path)
+    assert get_cwd() == os.getcwd()
+
+
+def test_cwd_finder_is_only_installed_inside_a_scope(tmp_path):
+    assert CwdFinder not in sys.meta_path
+    with scoped_cwd(str(tmp_path)):
+        with scoped_cwd(str(tmp_path)):
+            assert sys.meta_path[0] is CwdFinder
+        assert CwdFinder in sys.meta_path
+    assert CwdFinder not in sys.meta_path
+
+
+def test_tmp_cwd_changes_the_process_cwd(tmp_path):
+    before = os.getcwd()
+    with tmp_cwd(str(tmp_path)):
+        assert os.getcwd() == os.path.realpath(tmp_path)
+        assert get_cwd() == os.getcwd()
+    assert os.getcwd() == before
+
+
+def test_process_cwd_is_shared_by_tasks_in_the_same_directory(task_dirs):
+    before = os.getcwd()
+    inside = threading.Barrier(4)
+
+    def hold():
+        with process_cwd(task_dirs[0]):
+            # All four hold it at once; none waits for another to leave.
+            inside.wait(timeout=10)
+            return os.getcwd()
+
+    with ThreadPoolExecutor(4) as pool:
+        seen = list(pool.map(lambda _: hold(), range(4)))
+
+    assert seen == [task_dirs[0]] * 4
+    assert os.getcwd() == before
+
+
+def test_process_cwd_waits_for_other_directories(task_dirs):
+    order = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def first():
+        with process_cwd(task_dirs[0]):
+            entered.set()
+            release.wait(timeout=10)
+            order.append(("first", os.getcwd()))
+
+    def second():
+        entered.wait(timeout=10)
+        with process_cwd(task_dirs[1]):
+            order.append(("second", os.getcwd()))
+
+    threads = [threading.Thread(target=first), threading.Thread(target=second)]
+    for thread in threads:
+        thread.start()
+    entered.wait(timeout=10)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert order == [("first", task_dirs[0]), ("second", task_dirs[1])]
+
+
+def test_nesting_another_process_cwd_raises(task_dirs):
+    with process_cwd(task_dirs[0]):
+        with process_cwd(task_dirs[0]):
+            assert os.getcwd() == task_dirs[0]
+        with pytest.raises(RuntimeError):
+            with process_cwd(task_dirs[1]):
+                pass
@@ -0,0 +1,25 @@
+""" Incremental runs pick up from the database's clock, not the task host's. """
+
+from sqlalchemy import MetaData, create_engine
+from sqlalchemy.orm import Session
+
+from monorepo_invoke.etl_state import add_etl_tables
+from monorepo_invoke.watermark import database_now, incremental_run
+
+
+def test_watermark_is_the_database_time_the_run_started(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'etl.db'}")
+    metadata = MetaData()
+    add_etl_tables(metadata)
+    metadata.create_all(engine)
+
+    with Session(engine) as session:
+        with incremental_run(session, "job", {"rules": 1}) as since:
+            assert since is None
+            started = database_now(session)
+
+        with incremental_run(session, "job", {"rules": 1}) as since:
+            assert since is not None and since <= started
+
+        with incremental_run(session, "job", {"rules": 2}) as since:
+            assert since is None
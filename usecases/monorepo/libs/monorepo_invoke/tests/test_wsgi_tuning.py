@@ -0,0 +1,43 @@
+""" Load results only describe the requests the server actually handled. """
+
+import http.server
+import threading
+import time
+
+from monorepo_invoke.wsgi_tuning import drive_load
+
+
+class MostFail(http.server.BaseHTTPRequestHandler):
+    """ Three in four requests fail at once; the rest succeed slowly. """
+
+    protocol_version = "HTTP/1.1"
+    count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        with self.lock:
+            MostFail.count += 1
+            status = 200 if MostFail.count % 4 == 0 else 500
+        if status == 200:
+            time.sleep(0.02)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def test_failures_are_reported_apart_from_latency_and_throughput():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MostFail)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = drive_load("127.0.0.1", server.server_address[1], "/", 40, 4)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result["errors"] == 30
+    assert result["error_rate"] == 0.75
+    # Only the slow successes count, so no percentile sees the instant 500s.
+    assert result["p50"] >= 20
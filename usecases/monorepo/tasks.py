@@ -0,0 +1,88 @@
+""" Monorepo level tasks that fan out to the apps under ./apps. """
+
+import time
+
+from invoke import Exit, task
+
+from monorepo_invoke.affected import (
+    affected_apps,
+    changed_paths,
+    list_apps,
+    run_for_apps,
+)
+from monorepo_invoke.pipeline import DEPLOY_STAGES, format_results, run_pipeline
+
+
+@task(
+    help={
+        "ref": "Git ref to diff the working tree against",
+        "task_name": "Task to run for each affected app, e.g. test, docker-build, deploy",
+        "jobs": "How many apps to run at the same time",
+        "list_only": "Only print the affected apps",
+    }
+)
+def affected(ctx, ref="origin/master", task_name="test", jobs=4, list_only=False):
+    """ Run a task for every app affected by changes since a git ref. """
+
+    paths = changed_paths(ctx, ref)
+    apps = affected_apps(paths, list_apps("."))
+
+    if not apps:
+        print(f"No apps affected by changes since {ref}.")
+        return
+
+    print(f"Apps affected by changes since {ref}: {', '.join(apps)}")
+    if list_only:
+        return
+
+    statuses = run_for_apps(ctx, apps, task_name, jobs)
+
+    failed = [app for app, ok in sorted(statuses.items()) if not ok]
+    if failed:
+        raise Exit(f"{task_name} failed for: {', '.join(failed)}", code=1)
+
+
+@task(
+    help={
+        "app": "App to deploy, may be given more than once; defaults to every app",
+        "build_jobs": "How many apps may build at the same time",
+        "push_jobs": "How many apps may push at the same time",
+        "deploy_jobs": "How many apps may deploy at the same time",
+    },
+    iterable=["app"],
+)
+def deploy_apps(
+    ctx,
+    app=None,
+    project="APROJECTNAME",
+    promote=False,
+    with_cron=False,
+    build_jobs=1,
+    push_jobs=2,
+    deploy_jobs=2,
+):
+    """ Build, push and deploy several apps, overlapping the stages across apps. """
+
+    apps = app or list_apps(".")
+    deploy_flags = (" --promote" if promote else "") + (" --with-cron" if with_cron else "")
+
+    start = time.time()
+    results = run_pipeline(
+        ctx,
+        apps,
+        DEPLOY_STAGES,
+        {"build": build_jobs, "push": push_jobs, "deploy": deploy_jobs},
+        {"project": project, "deploy_flags": deploy_flags},
+    )
+
+    print()
+    print(format_results(results))
+    print(f"Finished in {time.time() - start:.1f}s")
+
+    failed = [
+        name
+        for name, stages in results.items()
+        if any(result.status != "ok" for result in stages.values())
+    ]
+    if failed:
+        raise Exit(f"deploy failed for: {', '.join(failed)}", code=1)